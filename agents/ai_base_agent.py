@@ -1,21 +1,194 @@
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
 import os
+import json
+import asyncio
+import logging
+import hashlib
+import copy
+import time
+from collections import OrderedDict
+from functools import lru_cache
+import httpx
 from dotenv import load_dotenv
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_openai import ChatOpenAI
 from langchain_core.memory import BaseMemory
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain.tools import BaseTool
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from .request_context import request_scope, request_timestamp
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Process-wide LLM/embedding clients shared by all agent instances so
+# connection pools and tokenizers are reused instead of rebuilt per agent
+_LLM_CACHE: Dict[Tuple[str, float, bool], ChatOpenAI] = {}
+_EMBEDDINGS_SINGLETON: Optional[Embeddings] = None
+_HTTP_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+
+def _get_http_async_client() -> httpx.AsyncClient:
+    """Get the shared keep-alive HTTP client used for OpenAI requests."""
+    global _HTTP_ASYNC_CLIENT
+    if _HTTP_ASYNC_CLIENT is None:
+        _HTTP_ASYNC_CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+    return _HTTP_ASYNC_CLIENT
+
+async def close_http_client() -> None:
+    """Close the shared OpenAI HTTP client if it was created."""
+    global _HTTP_ASYNC_CLIENT
+    if _HTTP_ASYNC_CLIENT is not None:
+        await _HTTP_ASYNC_CLIENT.aclose()
+        _HTTP_ASYNC_CLIENT = None
+        # The shared models hold the closed client, so later agents build new ones
+        _LLM_CACHE.clear()
+
+def _get_llm(model_name: str, temperature: float, streaming: bool = True) -> ChatOpenAI:
+    """Get a shared ChatOpenAI instance for the given configuration."""
+    key = (model_name, temperature, streaming)
+    llm = _LLM_CACHE.get(key)
+    if llm is None:
+        llm = ChatOpenAI(
+            model_name=model_name,
+            temperature=temperature,
+            streaming=streaming,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_async_client=_get_http_async_client()
+        )
+        _LLM_CACHE[key] = llm
+    return llm
+
+def _get_embedding_store():
+    """Get the byte store backing the embedding cache (Redis if configured)."""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        try:
+            from langchain_community.storage import RedisStore
+            return RedisStore(redis_url=redis_url)
+        except Exception as e:
+            logger.warning(f"Redis embedding cache unavailable, falling back to local files: {str(e)}")
+    
+    from langchain.storage import LocalFileStore
+    return LocalFileStore(os.getenv("EMBEDDING_CACHE_PATH", ".embed_cache"))
+
+def _get_embeddings() -> Embeddings:
+    """Get the shared embeddings instance, cached by content hash."""
+    global _EMBEDDINGS_SINGLETON
+    if _EMBEDDINGS_SINGLETON is None:
+        embeddings = OpenAIEmbeddings()
+        # Namespace cached vectors by model, so a model change never serves stale vectors
+        _EMBEDDINGS_SINGLETON = CacheBackedEmbeddings.from_bytes_store(
+            underlying_embeddings=embeddings,
+            document_embedding_cache=_get_embedding_store(),
+            namespace=embeddings.model
+        )
+    return _EMBEDDINGS_SINGLETON
+
+# In-process LRU of query embeddings keyed by SHA-256 of the query text
+_QUERY_EMBEDDING_CACHE: "OrderedDict[str, List[float]]" = OrderedDict()
+_QUERY_EMBEDDING_CACHE_SIZE = 4096
+
+def _embed_query(text: str) -> List[float]:
+    """Embed a query, reusing the result for previously seen text."""
+    key = hashlib.sha256(text.encode()).hexdigest()
+    embedding = _QUERY_EMBEDDING_CACHE.get(key)
+    if embedding is not None:
+        _QUERY_EMBEDDING_CACHE.move_to_end(key)
+        return embedding
+    
+    embedding = _get_embeddings().embed_query(text)
+    _QUERY_EMBEDDING_CACHE[key] = embedding
+    if len(_QUERY_EMBEDDING_CACHE) > _QUERY_EMBEDDING_CACHE_SIZE:
+        _QUERY_EMBEDDING_CACHE.popitem(last=False)
+    return embedding
+
+# Seconds an agent's response is reused for an identical message
+AGENT_RESPONSE_CACHE_TTL = float(os.getenv("AGENT_RESPONSE_CACHE_TTL", 300))
+AGENT_RESPONSE_CACHE_SIZE = 1024
+
+def _response_cache_key(agent_name: str, model_name: str, message: Dict[str, Any]) -> str:
+    """Digest of everything that determines an agent's response to a message."""
+    payload = json.dumps({"a": agent_name, "m": model_name, "msg": message}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+# HNSW parameters for agent memory collections (approximate nearest
+# neighbour search instead of a scan as the collection grows)
+VECTOR_INDEX_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 200
+}
+
+# Maximum length of a single text written to vector memory
+MEMORY_MAX_CHARS = int(os.getenv("MEMORY_MAX_CHARS", 2048))
+
+# Background memory writes are flushed when this many texts are queued,
+# or after this many seconds
+MEMORY_WRITE_BATCH_SIZE = 32
+MEMORY_WRITE_INTERVAL = 0.05
+
+# Smaller model for simple tool-only requests, whichever agent receives them
+LIGHT_MODEL_NAME = os.getenv("LIGHT_MODEL_NAME", "gpt-4o-mini")
+LIGHT_MESSAGE_TYPES = frozenset({"market_scan", "portfolio_snapshot"})
+
+# Maximum number of stored-text hashes remembered per agent
+STORED_HASHES_LIMIT = 10000
+
+# Concurrency ceiling for batched agent calls. Keep
+# BATCH_MAX_CONCURRENCY * (model calls per agent run) within the OpenAI
+# tier's RPM limit (e.g. ~500 RPM on tier 1), otherwise requests hit 429s.
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 10))
+
+# Token bucket shared by all batched calls in this process
+_batch_rate_limiter = InMemoryRateLimiter(
+    requests_per_second=float(os.getenv("BATCH_REQUESTS_PER_SECOND", 8)),
+    check_every_n_seconds=0.05,
+    max_bucket_size=BATCH_MAX_CONCURRENCY
+)
+
+async def _throttle(inputs: Any) -> Any:
+    """Wait for a rate limiter token before passing inputs through."""
+    await _batch_rate_limiter.aacquire()
+    return inputs
+
+async def _invoke_executor(item: Tuple[AgentExecutor, Dict[str, Any]], config: RunnableConfig) -> Dict[str, Any]:
+    """Run one batched input on the executor chosen for it."""
+    executor, inputs = item
+    return await executor.ainvoke(inputs, config=config)
+
+# System prompt template. Agent details are bound as partial variables, so
+# braces in a role description are never parsed as template fields.
+SYSTEM_PROMPT = """You are {agent_name}, an AI agent with the following role: {agent_role}
+            You have access to the following tools: {tool_names}
+            Use these tools to accomplish your tasks. Always explain your reasoning before taking actions.
+            Maintain a professional and helpful demeanor."""
+
+@lru_cache(maxsize=32)
+def _build_prompt(agent_name: str, agent_role: str, tool_names: Tuple[str, ...], memory_key: str) -> ChatPromptTemplate:
+    """Build the agent prompt template once per agent configuration."""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        MessagesPlaceholder(variable_name=memory_key),
+        ("human", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+    return prompt.partial(
+        agent_name=agent_name,
+        agent_role=agent_role,
+        tool_names=str(list(tool_names))
+    )
+
 class AIBaseAgent:
     def __init__(
         self,
@@ -33,32 +206,28 @@ class AIBaseAgent:
         self.temperature = temperature
         self.model_name = model_name
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model_name=model_name,
-            temperature=temperature,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+        # Initialize LLM (shared across agents with the same configuration)
+        self.llm = _get_llm(model_name, temperature, streaming=True)
         
-        # Initialize chat history
-        self.chat_history: List[BaseChatMessageHistory] = []
+        # Vector store for long-term memory, created on first use
+        self._vectorstore: Optional[Chroma] = None
         
-        # Initialize vector store for long-term memory
-        self.vectorstore = Chroma(
-            collection_name=f"{agent_name}_memory",
-            embedding_function=OpenAIEmbeddings()
-        )
+        # Hashes of texts already written to the vector store (bounded LRU),
+        # and of texts queued but not yet written
+        self._stored_hashes: "OrderedDict[str, None]" = OrderedDict()
+        self._pending_hashes: set = set()
         
-        # Create agent prompt
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are {agent_name}, an AI agent with the following role: {agent_role}
-            You have access to the following tools: {[tool.name for tool in tools]}
-            Use these tools to accomplish your tasks. Always explain your reasoning before taking actions.
-            Maintain a professional and helpful demeanor."""),
-            MessagesPlaceholder(variable_name=memory_key),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
+        # Background writer for vector memory, started on first write
+        self._memory_queue: Optional[asyncio.Queue] = None
+        self._memory_writer: Optional[asyncio.Task] = None
+        
+        # Create agent prompt (shared by agents with the same configuration)
+        self.prompt = _build_prompt(
+            agent_name,
+            agent_role,
+            tuple(tool.name for tool in tools),
+            memory_key
+        )
         
         # Create agent
         self.agent = create_openai_tools_agent(
@@ -75,12 +244,34 @@ class AIBaseAgent:
             verbose=True,
             handle_parsing_errors=True
         )
+        
+        # Executor on the light model for simple requests, created on first use
+        self._light_executor: Optional[AgentExecutor] = None
+        
+        # Memory-less executors for batched calls, keyed by model name
+        self._batch_executors: Dict[str, AgentExecutor] = {}
+        
+        # Recent responses by message digest: {key: (expires_at, response)}
+        self._response_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
     
     def _get_memory(self) -> BaseMemory:
-        """Get memory implementation for the agent."""
-        from langchain.memory import ConversationBufferMemory
+        """Get memory implementation for the agent.
+        
+        Older turns are compressed into a running summary once the buffer
+        exceeds the token limit, so prompt size stays bounded.
+        """
+        from langchain.memory import ConversationSummaryBufferMemory
+        
+        # Summarize with a cheaper model rather than the agent's main LLM
+        summary_llm = _get_llm(
+            os.getenv("SUMMARY_MODEL_NAME", "gpt-4o-mini"),
+            0.0,
+            streaming=False
+        )
         
-        return ConversationBufferMemory(
+        return ConversationSummaryBufferMemory(
+            llm=summary_llm,
+            max_token_limit=1500,
             memory_key=self.memory_key,
             return_messages=True,
             output_key="output"
@@ -88,60 +279,351 @@ class AIBaseAgent:
     
     async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Process incoming messages using the AI agent."""
-        try:
-            # Add message to chat history
-            self.chat_history.append(HumanMessage(content=str(message)))
-            
-            # Process with agent
-            response = await self.agent_executor.ainvoke({
-                "input": str(message),
-                self.memory_key: self.chat_history
-            })
-            
-            # Add response to chat history
-            self.chat_history.append(AIMessage(content=str(response)))
-            
-            # Store in vector memory
-            self._store_in_memory(message, response)
+        with request_scope() as now_iso:
+            try:
+                # Repeated messages reuse the recent response instead of re-running the agent
+                cache_key = _response_cache_key(self.agent_name, self.model_name, message)
+                response = self._get_cached_response(cache_key)
+                if response is not None:
+                    return {
+                        "status": "success",
+                        "message": "Message processed by AI agent",
+                        "response": response,
+                        "timestamp": now_iso
+                    }
+                
+                # Process with agent by consuming the event stream (the executor's
+                # memory supplies the chat history)
+                response = None
+                chunks: List[str] = []
+                async for event in self._stream_events(message):
+                    if event["event"] == "on_chat_model_stream":
+                        content = event["data"]["chunk"].content
+                        if content:
+                            chunks.append(content)
+                    elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                        response = event["data"].get("output")
+                
+                if response is None:
+                    response = {"input": str(message), "output": "".join(chunks)}
+                
+                # Store in vector memory
+                self._store_in_memory(message, response)
+                self._store_cached_response(cache_key, response)
+                
+                return {
+                    "status": "success",
+                    "message": "Message processed by AI agent",
+                    "response": response,
+                    "timestamp": now_iso
+                }
+                
+            except Exception as e:
+                return {
+                    "status": "error",
+                    "message": f"Error processing message: {str(e)}",
+                    "timestamp": now_iso
+                }
+    
+    def _get_cached_response(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the response to an identical recent message, dropping it once expired."""
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self._response_cache[key]
+            return None
+        self._response_cache.move_to_end(key)
+        # Copy so callers never share, or modify, the cached response
+        return copy.deepcopy(response)
+    
+    def _store_cached_response(self, key: str, response: Dict[str, Any]) -> None:
+        """Store the response to a message, evicting the oldest when full."""
+        self._response_cache[key] = (time.monotonic() + AGENT_RESPONSE_CACHE_TTL, copy.deepcopy(response))
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > AGENT_RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
+    async def process_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Process several independent messages concurrently.
+        
+        Fans out through abatch with an explicit concurrency cap (abatch
+        otherwise runs serially) behind a shared rate limiter. Batched
+        messages are independent, so they run on memory-less executors and
+        neither read nor write the conversation history.
+        """
+        if not messages:
+            return []
+        
+        with request_scope() as now_iso:
+            inputs = [
+                (self._select_executor(message, memory=False), {"input": str(message), self.memory_key: []})
+                for message in messages
+            ]
+            chain = RunnableLambda(_throttle) | RunnableLambda(_invoke_executor)
+            responses = await chain.abatch(
+                inputs,
+                config={"max_concurrency": BATCH_MAX_CONCURRENCY},
+                return_exceptions=True
+            )
             
-            return {
-                "status": "success",
-                "message": "Message processed by AI agent",
-                "response": response,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            results = []
+            for message, response in zip(messages, responses):
+                if isinstance(response, Exception):
+                    results.append({
+                        "status": "error",
+                        "message": f"Error processing message: {str(response)}",
+                        "timestamp": now_iso
+                    })
+                    continue
+                
+                self._store_in_memory(message, response)
+                results.append({
+                    "status": "success",
+                    "message": "Message processed by AI agent",
+                    "response": response,
+                    "timestamp": now_iso
+                })
             
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": f"Error processing message: {str(e)}",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            return results
+    
+    async def astream_message(self, message: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the agent's response to a message token by token."""
+        async for event in self._stream_events(message):
+            if event["event"] == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if content:
+                    yield content
+    
+    def _select_executor(self, message: Dict[str, Any], memory: bool = True) -> AgentExecutor:
+        """Pick the executor for a message, routing simple request types to the light model.
+        
+        With memory=False the executor has no conversation memory, for
+        callers that run messages independently of each other.
+        """
+        message_type = message.get("type") if isinstance(message, dict) else None
+        if message_type not in LIGHT_MESSAGE_TYPES or self.model_name == LIGHT_MODEL_NAME:
+            logger.debug("[%s] Using model %s for %s", self.agent_name, self.model_name, message_type or 'message')
+            return self.agent_executor if memory else self._batch_executor(self.model_name)
+        
+        if not memory:
+            logger.debug("[%s] Using model %s for %s", self.agent_name, LIGHT_MODEL_NAME, message_type)
+            return self._batch_executor(LIGHT_MODEL_NAME)
+        
+        if self._light_executor is None:
+            light_agent = create_openai_tools_agent(
+                llm=_get_llm(LIGHT_MODEL_NAME, self.temperature, streaming=True),
+                tools=self.tools,
+                prompt=self.prompt
+            )
+            # Share the conversation memory with the main executor
+            self._light_executor = AgentExecutor(
+                agent=light_agent,
+                tools=self.tools,
+                memory=self.agent_executor.memory,
+                verbose=True,
+                handle_parsing_errors=True
+            )
+        
+        logger.debug("[%s] Using model %s for %s", self.agent_name, LIGHT_MODEL_NAME, message_type)
+        return self._light_executor
+    
+    def _batch_executor(self, model_name: str) -> AgentExecutor:
+        """Memory-less executor on the given model, created on first use."""
+        executor = self._batch_executors.get(model_name)
+        if executor is None:
+            if model_name == self.model_name:
+                agent = self.agent
+            else:
+                agent = create_openai_tools_agent(
+                    llm=_get_llm(model_name, self.temperature, streaming=True),
+                    tools=self.tools,
+                    prompt=self.prompt
+                )
+            executor = self._batch_executors[model_name] = AgentExecutor(
+                agent=agent,
+                tools=self.tools,
+                verbose=True,
+                handle_parsing_errors=True
+            )
+        return executor
+    
+    def _stream_events(self, message: Dict[str, Any]):
+        """Run the agent executor and return its v2 event stream."""
+        return self._select_executor(message).astream_events(
+            {"input": str(message)},
+            version="v2"
+        )
     
     def _store_in_memory(self, input_message: Dict[str, Any], response: Dict[str, Any]) -> None:
         """Store interaction in vector memory for long-term retention."""
         metadata = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": request_timestamp(),
             "agent": self.agent_name,
             "type": "interaction"
         }
         
-        # Store both input and response
-        self.vectorstore.add_texts(
-            texts=[str(input_message), str(response)],
-            metadatas=[metadata, metadata]
-        )
+        # Store input and response, skipping texts this agent already stored or queued
+        texts, hashes = [], []
+        for item in (input_message, response):
+            text = self._memory_text(item)
+            text_hash = hashlib.sha256(text.encode()).hexdigest()
+            if text_hash in self._stored_hashes:
+                self._stored_hashes.move_to_end(text_hash)
+                continue
+            if text_hash in self._pending_hashes or text_hash in hashes:
+                continue
+            texts.append(text)
+            hashes.append(text_hash)
+        
+        if texts:
+            self._enqueue_memory_write(texts, [metadata] * len(texts), hashes)
+    
+    def _remember_hashes(self, hashes: List[str]) -> None:
+        """Record hashes of texts that were written to the vector store."""
+        for text_hash in hashes:
+            self._stored_hashes[text_hash] = None
+            self._stored_hashes.move_to_end(text_hash)
+        while len(self._stored_hashes) > STORED_HASHES_LIMIT:
+            self._stored_hashes.popitem(last=False)
+    
+    def _enqueue_memory_write(self, texts: List[str], metadatas: List[Dict[str, Any]], hashes: List[str]) -> None:
+        """Queue texts for the background memory writer, keeping writes off the response path."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (synchronous caller), so write directly
+            self.vectorstore.add_texts(texts=texts, metadatas=metadatas)
+            self._remember_hashes(hashes)
+            return
+        
+        if self._memory_queue is None:
+            self._memory_queue = asyncio.Queue()
+        if self._memory_writer is None or self._memory_writer.done():
+            self._memory_writer = asyncio.create_task(self._memory_writer_loop())
+        self._pending_hashes.update(hashes)
+        self._memory_queue.put_nowait((texts, metadatas, hashes))
+    
+    async def _memory_writer_loop(self) -> None:
+        """Drain queued memory writes, coalescing them into batched add_texts calls."""
+        loop = asyncio.get_running_loop()
+        queue = self._memory_queue
+        while True:
+            texts, metadatas, hashes = await queue.get()
+            texts, metadatas, hashes = list(texts), list(metadatas), list(hashes)
+            pending = 1
+            
+            # Collect more writes for a short window or until the batch is full
+            deadline = loop.time() + MEMORY_WRITE_INTERVAL
+            while len(texts) < MEMORY_WRITE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    more_texts, more_metadatas, more_hashes = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                texts.extend(more_texts)
+                metadatas.extend(more_metadatas)
+                hashes.extend(more_hashes)
+                pending += 1
+            
+            try:
+                store = self.vectorstore
+                await store.aadd_texts(texts=texts, metadatas=metadatas)
+                # Only mark texts as stored once the write succeeded, and not
+                # if the collection was cleared in the meantime
+                if store is self._vectorstore:
+                    self._remember_hashes(hashes)
+            except Exception as e:
+                logger.error(f"[{self.agent_name}] Error writing to vector memory: {str(e)}")
+            finally:
+                self._pending_hashes.difference_update(hashes)
+                for _ in range(pending):
+                    queue.task_done()
+    
+    async def flush_memory(self) -> None:
+        """Wait until all queued memory writes have been stored."""
+        if self._memory_queue is not None and self._memory_writer is not None and not self._memory_writer.done():
+            await self._memory_queue.join()
+    
+    async def close(self) -> None:
+        """Flush pending memory writes and stop the background writer."""
+        await self.flush_memory()
+        if self._memory_writer is not None:
+            self._memory_writer.cancel()
+            self._memory_writer = None
+    
+    @staticmethod
+    def _memory_text(item: Any) -> str:
+        """Project an item to the text worth embedding.
+        
+        Executor responses keep only their final output (intermediate steps
+        are dropped), typed messages are prefixed with their type, and
+        everything is serialized deterministically and truncated.
+        """
+        if isinstance(item, dict):
+            if "output" in item:
+                text = str(item["output"])
+            elif "type" in item:
+                summary = item.get("summary") or json.dumps(item, sort_keys=True, default=str)[:1024]
+                text = f"{item['type']}: {summary}"
+            else:
+                text = json.dumps(item, sort_keys=True, default=str)
+        elif isinstance(item, str):
+            text = item
+        else:
+            text = json.dumps(item, sort_keys=True, default=str)
+        return text[:MEMORY_MAX_CHARS]
     
     def get_memory_context(self, query: str, k: int = 5) -> List[str]:
         """Retrieve relevant memory context for a query."""
-        docs = self.vectorstore.similarity_search(query, k=k)
+        docs = self.vectorstore.similarity_search_by_vector(_embed_query(query), k=k)
         return [doc.page_content for doc in docs]
     
     def clear_memory(self) -> None:
         """Clear both conversation and vector memory."""
-        self.chat_history.clear()
-        self.vectorstore.delete_collection()
-        self.vectorstore = Chroma(
-            collection_name=f"{self.agent_name}_memory",
-            embedding_function=OpenAIEmbeddings()
+        self.agent_executor.memory.clear()
+        
+        # Stop the batch being written and drop writes still queued for the
+        # collection being cleared; the next write starts a new writer
+        if self._memory_writer is not None:
+            self._memory_writer.cancel()
+            self._memory_writer = None
+        if self._memory_queue is not None:
+            while not self._memory_queue.empty():
+                self._memory_queue.get_nowait()
+                self._memory_queue.task_done()
+        
+        if self._vectorstore is not None:
+            self._vectorstore.delete_collection()
+            self._vectorstore = None
+        self._stored_hashes.clear()
+        self._pending_hashes.clear()
+        self._response_cache.clear()
+    
+    @property
+    def vectorstore(self) -> Chroma:
+        """Vector store for long-term memory, initialized on first access."""
+        if self._vectorstore is None:
+            self._vectorstore = self._create_vectorstore()
+        return self._vectorstore
+    
+    def _create_vectorstore(self) -> Chroma:
+        """Create the agent's memory collection, using a tuned HNSW index when enabled."""
+        collection_name = f"{self.agent_name}_memory"
+        if os.getenv("MEMOS_USE_VEC_INDEX", "true").lower() == "true":
+            try:
+                return Chroma(
+                    collection_name=collection_name,
+                    embedding_function=_get_embeddings(),
+                    collection_metadata=VECTOR_INDEX_METADATA
+                )
+            except Exception as e:
+                logger.warning(f"Could not create indexed memory collection, using defaults: {str(e)}")
+        
+        return Chroma(
+            collection_name=collection_name,
+            embedding_function=_get_embeddings()
         ) 
\ No newline at end of file
@@ -1,18 +1,19 @@
 from typing import Dict, Any, List
-from datetime import datetime
+import asyncio
 from .ai_base_agent import AIBaseAgent
+from .request_context import request_scope
 from .trading_tools import (
-    MarketAnalysisTool,
-    RiskAssessmentTool,
-    TradeExecutionTool,
-    PortfolioAnalysisTool
+    MARKET_TOOL,
+    RISK_TOOL,
+    TRADE_TOOL,
+    PORTFOLIO_TOOL
 )
 
 class AITriggerAgent(AIBaseAgent):
     def __init__(self, agent_name: str = "TriggerAgent"):
         tools = [
-            MarketAnalysisTool(),
-            PortfolioAnalysisTool()
+            MARKET_TOOL,
+            PORTFOLIO_TOOL
         ]
         
         role = """You are an AI trading trigger agent responsible for initiating trading activities.
@@ -32,16 +33,17 @@ class AITriggerAgent(AIBaseAgent):
             agent_name=agent_name,
             agent_role=role,
             tools=tools,
-            temperature=0.7
+            temperature=0.7,
+            model_name="gpt-4o-mini"  # Market scanning does not need the larger model
         )
 
 class AIExpertTraderAgent(AIBaseAgent):
     def __init__(self, agent_name: str = "ExpertTraderAgent"):
         tools = [
-            MarketAnalysisTool(),
-            RiskAssessmentTool(),
-            TradeExecutionTool(),
-            PortfolioAnalysisTool()
+            MARKET_TOOL,
+            RISK_TOOL,
+            TRADE_TOOL,
+            PORTFOLIO_TOOL
         ]
         
         role = """You are an AI expert trader agent responsible for executing trading strategies.
@@ -66,10 +68,13 @@ class AIExpertTraderAgent(AIBaseAgent):
 
 class AIRiskEvaluatorAgent(AIBaseAgent):
     def __init__(self, agent_name: str = "RiskEvaluatorAgent"):
+        self.market_tool = MARKET_TOOL
+        self.risk_tool = RISK_TOOL
+        self.portfolio_tool = PORTFOLIO_TOOL
         tools = [
-            MarketAnalysisTool(),
-            RiskAssessmentTool(),
-            PortfolioAnalysisTool()
+            self.market_tool,
+            self.risk_tool,
+            self.portfolio_tool
         ]
         
         role = """You are an AI risk evaluator agent responsible for assessing trading risks.
@@ -94,35 +99,43 @@ class AIRiskEvaluatorAgent(AIBaseAgent):
     
     async def evaluate_strategy(self, strategy: Dict[str, Any], market_conditions: Dict[str, Any]) -> Dict[str, Any]:
         """Specialized method for strategy risk evaluation."""
-        try:
-            # Get risk assessment using the risk assessment tool
-            risk_assessment = await self.tools[1]._arun(strategy, market_conditions)
-            
-            # Get market analysis for additional context
-            market_analysis = await self.tools[0]._arun(
-                assets=strategy.get("assets", []),
-                timeframe=strategy.get("timeframe", "1d")
-            )
-            
-            # Get portfolio analysis for exposure assessment
-            portfolio_analysis = await self.tools[2]._arun(
-                portfolio_id=strategy.get("portfolio_id", "default")
-            )
-            
-            # Process all information through the agent
-            evaluation = await self.process_message({
-                "type": "risk_evaluation",
-                "strategy": strategy,
-                "risk_assessment": risk_assessment,
-                "market_analysis": market_analysis,
-                "portfolio_analysis": portfolio_analysis
-            })
-            
-            return evaluation
-            
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": f"Error in strategy evaluation: {str(e)}",
-                "timestamp": datetime.utcnow().isoformat()
-            } 
\ No newline at end of file
+        with request_scope() as now_iso:
+            try:
+                # Risk, market and portfolio analyses are independent, so run them concurrently
+                risk_assessment, market_analysis, portfolio_analysis = await asyncio.gather(
+                    self.risk_tool._arun(strategy, market_conditions),
+                    self.market_tool._arun(
+                        assets=strategy.get("assets", []),
+                        timeframe=strategy.get("timeframe", "1d")
+                    ),
+                    self.portfolio_tool._arun(
+                        portfolio_id=strategy.get("portfolio_id", "default")
+                    ),
+                    return_exceptions=True
+                )
+                
+                # Surface individual tool failures without discarding the other results
+                if isinstance(risk_assessment, Exception):
+                    risk_assessment = {"error": f"Risk assessment failed: {str(risk_assessment)}"}
+                if isinstance(market_analysis, Exception):
+                    market_analysis = {"error": f"Market analysis failed: {str(market_analysis)}"}
+                if isinstance(portfolio_analysis, Exception):
+                    portfolio_analysis = {"error": f"Portfolio analysis failed: {str(portfolio_analysis)}"}
+                
+                # Process all information through the agent
+                evaluation = await self.process_message({
+                    "type": "risk_evaluation",
+                    "strategy": strategy,
+                    "risk_assessment": risk_assessment,
+                    "market_analysis": market_analysis,
+                    "portfolio_analysis": portfolio_analysis
+                })
+                
+                return evaluation
+                
+            except Exception as e:
+                return {
+                    "status": "error",
+                    "message": f"Error in strategy evaluation: {str(e)}",
+                    "timestamp": now_iso
+                } 
\ No newline at end of file
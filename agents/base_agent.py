@@ -1,19 +1,94 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import jwt
 from datetime import datetime
 import os
+import asyncio
 from dotenv import load_dotenv
-import redis
+import redis.asyncio as aioredis
 import logging
-import json
+import orjson
+import time
+import hashlib
+from collections import OrderedDict
+from operator import itemgetter
 from backend.did_registry import did_registry
+from .request_context import request_timestamp
 from backend.eth_jwt_utils import verify_jwt_with_ethereum_key, sign_jwt_with_ethereum_key, create_jwt_payload
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of verified tokens remembered per agent
+VERIFIED_TOKEN_CACHE_SIZE = 1024
+
+# Seconds a verified ask/session stays valid, in Redis and in memory
+SESSION_TTL = 3600
+
+# Maximum number of verified (ask_id, did) sessions kept in memory per agent
+VERIFIED_SESSION_CACHE_SIZE = 10000
+
+# Seconds verified token claims stay in the Redis cache shared across processes
+SHARED_TOKEN_CACHE_TTL = 60
+
+# Cached token claims stop being reused this many seconds before the token expires
+TOKEN_EXPIRY_LEEWAY = 5
+
+# Concurrent token verifications offloaded to worker threads
+_VERIFY_SEMAPHORE = asyncio.Semaphore(int(os.getenv('VERIFY_MAX_CONCURRENCY', 32)))
+
+# Redis connection pool shared by all agents in this process
+_REDIS_POOL = aioredis.ConnectionPool.from_url(os.getenv('REDIS_URL'), max_connections=32) if os.getenv('REDIS_URL') else None
+
+# Seconds a registry public key is reused before it is looked up again, so rotated
+# keys are picked up, and the maximum number of keys kept
+PUBLIC_KEY_CACHE_TTL = 300
+PUBLIC_KEY_CACHE_SIZE = 2048
+
+# Registry public keys shared by all agents in this process: {did: (expires_at, public_key)}, LRU ordered
+_PUBLIC_KEY_CACHE: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+# Fields every message sent to an agent's process_message must carry, unpacked in one call
+REQUIRED_MESSAGE_FIELDS = itemgetter('ask_id', 'sender_did', 'token', 'public_key')
+
+# DID method prefixes; did:ethr: DIDs are stored in the registry as did:eth:
+_DID_ETHR_PREFIX = 'did:ethr:'
+_DID_ETH_PREFIX = 'did:eth:'
+
+def _normalize_did(did: str) -> str:
+    """Normalize a did:ethr: DID to the did:eth: form used by the registry."""
+    if did.startswith(_DID_ETHR_PREFIX):
+        return _DID_ETH_PREFIX + did[len(_DID_ETHR_PREFIX):]
+    return did
+
+def _lookup_public_key(did: str) -> Optional[str]:
+    """Look up a DID's public key in the registry, reusing successful lookups within the TTL."""
+    cached = _PUBLIC_KEY_CACHE.get(did)
+    if cached is not None:
+        expires_at, public_key = cached
+        if expires_at > time.monotonic():
+            _PUBLIC_KEY_CACHE.move_to_end(did)
+            return public_key
+        del _PUBLIC_KEY_CACHE[did]
+    
+    public_key = did_registry.get(did)
+    # Misses are not cached, so a newly registered DID is found on the next lookup
+    if public_key:
+        _PUBLIC_KEY_CACHE[did] = (time.monotonic() + PUBLIC_KEY_CACHE_TTL, public_key)
+        if len(_PUBLIC_KEY_CACHE) > PUBLIC_KEY_CACHE_SIZE:
+            _PUBLIC_KEY_CACHE.popitem(last=False)
+    return public_key
+
+def _token_digest(token: str) -> bytes:
+    """Short, fixed-size digest identifying a token without keeping the token itself."""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def _peek_jwt_sub(token: str) -> str:
+    """Read the subject (DID) claim from a JWT without verifying its signature."""
+    payload = jwt.decode(token, options={"verify_signature": False})
+    return payload.get('sub', '')
+
 class AgentMessage:
     """Structured message format for agent communication"""
     def __init__(
@@ -32,6 +107,14 @@ class AgentMessage:
         self.token = token
         self.timestamp = timestamp or datetime.utcnow().isoformat()
 
+    def __repr__(self) -> str:
+        # Compact form for logs: content is summarized by its keys and the token left out
+        content_keys = list(self.content) if isinstance(self.content, dict) else type(self.content).__name__
+        return (
+            f"AgentMessage(type={self.type!r}, sender_did={self.sender_did!r}, "
+            f"recipient_did={self.recipient_did!r}, timestamp={self.timestamp!r}, content={content_keys!r})"
+        )
+
     def to_dict(self) -> Dict[str, Any]:
         return {
             "type": self.type,
@@ -57,27 +140,36 @@ class BaseAgent(ABC):
     def __init__(self, did: str, name: str):
         self.did = did
         self.name = name
+        # Own DID and keys are fixed for the agent's lifetime, so resolve them once
+        self._normalized_did = _normalize_did(did)
+        self._private_key = did_registry.get_private_key(self._normalized_did)
+        self._public_key = did_registry.get(self._normalized_did)
+        # Static part of get_credentials(), built once the public key is known
+        self._credentials: Optional[Dict[str, Any]] = None
         self.jwt_secret = os.getenv('JWT_SECRET')
-        # Session-based verification state: {ask_id: {did: {verified: bool, public_key: str}}}
-        self.verified_sessions: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Session-based verification state when Redis is not configured:
+        # {(ask_id, did): (expires_at, {verified: bool, public_key: str, ...})}, LRU ordered
+        self.verified_sessions: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Verified token claims: {(token digest, public_key, algorithm): (exp, claims)}, LRU ordered
+        self._verified_token_cache: "OrderedDict[Tuple[bytes, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
         self.redis_url = os.getenv('REDIS_URL')
         self.redis_client = None
         if self.redis_url:
-            self.redis_client = redis.Redis.from_url(self.redis_url)
+            self.redis_client = aioredis.Redis(connection_pool=_REDIS_POOL)
         logger.info(f"Initialized {name} with DID: {did}")
     
     async def verify_agent(self, ask_id: str, did: str, token: str, public_key: str, algorithm: str = 'ES256K') -> Dict[str, Any]:
         """Verify another agent's DID/JWT using the provided public key."""
         try:
-            logger.info(f"[{self.name}] Verifying agent: did={did}, token={token[:10]}..., public_key={public_key[:10] if public_key else 'None'}...")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[%s] Verifying agent: did=%s, token=%s..., public_key=%s...", self.name, did, token[:10], public_key[:10] if public_key else 'None')
             
             # Normalize DID format for registry lookup
-            normalized_did = did.replace('did:ethr:', 'did:eth:')
+            normalized_did = _normalize_did(did)
             
             # Get actual public key from registry if DID was provided
             if public_key.startswith('did:'):
-                sender_normalized_did = public_key.replace('did:ethr:', 'did:eth:')
-                actual_public_key = did_registry.get(sender_normalized_did)
+                actual_public_key = self.lookup_public_key(public_key)
                 if not actual_public_key:
                     logger.error(f"[{self.name}] No public key found for DID: {public_key}")
                     return {"verified": False, "message": "No public key found for DID"}
@@ -86,7 +178,7 @@ class BaseAgent(ABC):
             # Verify token with public key
             try:
                 verified_data = await self.verify_token(token, public_key, algorithm=algorithm)
-                logger.info(f"[{self.name}] Token verified successfully: {verified_data}")
+                logger.info("[%s] Token verified successfully: %s", self.name, verified_data)
                 
                 # Check if token DID matches provided DID
                 token_did = verified_data.get('sub')  # JWT subject is the DID
@@ -98,19 +190,20 @@ class BaseAgent(ABC):
                 verification_state = {
                     "verified": True,
                     "public_key": public_key,
-                    "verified_at": datetime.utcnow().isoformat()
+                    "verified_at": request_timestamp(),
+                    # Claims of the verified token, reused instead of verifying it again
+                    "token_digest": _token_digest(token).hex(),
+                    "claims": verified_data
                 }
                 
                 if self.redis_client:
-                    self.redis_client.setex(
+                    await self.redis_client.setex(
                         f"session:{ask_id}:{normalized_did}",
-                        3600,  # 1 hour expiry
-                        json.dumps(verification_state)
+                        SESSION_TTL,
+                        orjson.dumps(verification_state)
                     )
                 else:
-                    if ask_id not in self.verified_sessions:
-                        self.verified_sessions[ask_id] = {}
-                    self.verified_sessions[ask_id][normalized_did] = verification_state
+                    self._store_session(ask_id, normalized_did, verification_state)
                 
                 return {"verified": True, "data": verified_data}
                 
@@ -122,57 +215,160 @@ class BaseAgent(ABC):
             logger.error(f"[{self.name}] Agent verification failed: {str(e)}")
             return {"verified": False, "message": str(e)}
     
-    def is_verified(self, ask_id: str, did: str) -> bool:
+    async def is_verified(self, ask_id: str, did: str) -> bool:
         """Check if a DID is verified for a given ask/session."""
-        normalized_did = did.replace('did:ethr:', 'did:eth:')
+        normalized_did = _normalize_did(did)
         if self.redis_client:
-            state = self.redis_client.get(f"session:{ask_id}:{normalized_did}")
+            state = await self.redis_client.get(f"session:{ask_id}:{normalized_did}")
             if state:
-                verification_state = json.loads(state)
+                verification_state = orjson.loads(state)
                 return verification_state.get("verified", False)
             return False
-        return self.verified_sessions.get(ask_id, {}).get(normalized_did, {}).get("verified", False)
+        session_data = self._get_session(ask_id, normalized_did)
+        return bool(session_data and session_data.get("verified", False))
     
-    def get_verified_public_key(self, ask_id: str, did: str) -> Optional[str]:
+    async def get_verified_public_key(self, ask_id: str, did: str) -> Optional[str]:
         """Get the public key used for verification of a DID in a session."""
-        normalized_did = did.replace('did:ethr:', 'did:eth:')
+        normalized_did = _normalize_did(did)
         if self.redis_client:
-            state = self.redis_client.get(f"session:{ask_id}:{normalized_did}")
+            state = await self.redis_client.get(f"session:{ask_id}:{normalized_did}")
             if state:
                 try:
-                    verification_state = json.loads(state)
+                    verification_state = orjson.loads(state)
                     if isinstance(verification_state, dict):
                         return verification_state.get("public_key")
                     else:
                         # If it's just a boolean, we don't have the public key stored
                         return None
-                except (json.JSONDecodeError, TypeError):
+                except (orjson.JSONDecodeError, TypeError):
                     return None
             return None
         
         # For in-memory storage
-        session_data = self.verified_sessions.get(ask_id, {}).get(normalized_did)
+        session_data = self._get_session(ask_id, normalized_did)
         if isinstance(session_data, dict):
             return session_data.get("public_key")
         else:
             # If it's just a boolean, we don't have the public key stored
             return None
     
-    def end_ask(self, ask_id: str):
+    async def get_verified_claims(self, ask_id: str, did: str, token: str) -> Optional[Dict[str, Any]]:
+        """Get the claims stored when this exact token was verified for a DID in a session."""
+        normalized_did = _normalize_did(did)
+        if self.redis_client:
+            state = await self.redis_client.get(f"session:{ask_id}:{normalized_did}")
+            if not state:
+                return None
+            try:
+                session_data = orjson.loads(state)
+            except orjson.JSONDecodeError:
+                return None
+        else:
+            session_data = self._get_session(ask_id, normalized_did)
+        
+        if not isinstance(session_data, dict) or session_data.get("token_digest") != _token_digest(token).hex():
+            return None
+        # Sessions outlive tokens, so an expired token must be verified again
+        claims = session_data.get("claims")
+        exp = claims.get("exp") if isinstance(claims, dict) else None
+        if not isinstance(exp, (int, float)) or exp <= time.time() + TOKEN_EXPIRY_LEEWAY:
+            return None
+        return claims
+    
+    async def end_ask(self, ask_id: str):
         """Clear verification state for a completed ask/session."""
         if self.redis_client:
-            # Remove all DIDs for this ask_id
-            keys = self.redis_client.keys(f"session:{ask_id}:*")
-            if keys:
-                self.redis_client.delete(*keys)
+            # Remove all DIDs for this ask_id (SCAN avoids blocking Redis like KEYS)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                async for key in self.redis_client.scan_iter(match=f"session:{ask_id}:*", count=500):
+                    pipe.delete(key)
+                await pipe.execute()
         else:
-            if ask_id in self.verified_sessions:
-                del self.verified_sessions[ask_id]
+            for key in [key for key in self.verified_sessions if key[0] == ask_id]:
+                del self.verified_sessions[key]
+    
+    def _get_session(self, ask_id: str, normalized_did: str) -> Optional[Dict[str, Any]]:
+        """Get in-memory verification state for a session, dropping it once expired."""
+        key = (ask_id, normalized_did)
+        entry = self.verified_sessions.get(key)
+        if entry is None:
+            return None
+        expires_at, state = entry
+        if expires_at <= time.monotonic():
+            del self.verified_sessions[key]
+            return None
+        self.verified_sessions.move_to_end(key)
+        return state
+    
+    def _store_session(self, ask_id: str, normalized_did: str, state: Dict[str, Any]) -> None:
+        """Store in-memory verification state for a session, evicting the oldest when full."""
+        key = (ask_id, normalized_did)
+        self.verified_sessions[key] = (time.monotonic() + SESSION_TTL, state)
+        self.verified_sessions.move_to_end(key)
+        if len(self.verified_sessions) > VERIFIED_SESSION_CACHE_SIZE:
+            self.verified_sessions.popitem(last=False)
     
     async def verify_token(self, token: str, public_key: Optional[str] = None, algorithm: str = 'ES256K') -> Dict[str, Any]:
-        """Verify a JWT token using the provided public key."""
+        """Verify a JWT token, reusing the claims of an unexpired token verified earlier."""
+        # Key on a digest so the cache does not hold on to full token strings
+        cache_key = (_token_digest(token), public_key or '', algorithm)
+        cached = self._verified_token_cache.get(cache_key)
+        if cached is not None:
+            exp, claims = cached
+            if exp > time.time() + TOKEN_EXPIRY_LEEWAY:
+                self._verified_token_cache.move_to_end(cache_key)
+                return dict(claims)
+            # Evict expired entry lazily
+            del self._verified_token_cache[cache_key]
+        
+        # Then the short-lived cache shared with other agent processes
+        redis_key = None
+        if self.redis_client:
+            redis_key = "verified:" + hashlib.blake2b(
+                b"\0".join((cache_key[0], cache_key[1].encode(), algorithm.encode())),
+                digest_size=16
+            ).hexdigest()
+            shared = await self.redis_client.get(redis_key)
+            if shared:
+                try:
+                    claims = orjson.loads(shared)
+                except orjson.JSONDecodeError:
+                    claims = None
+                exp = claims.get('exp') if isinstance(claims, dict) else None
+                if isinstance(exp, (int, float)) and exp > time.time() + TOKEN_EXPIRY_LEEWAY:
+                    self._remember_token(cache_key, float(exp), claims)
+                    return dict(claims)
+        
+        if algorithm == 'ES256K':
+            # The ES256K path is a mock: verify_jwt_with_ethereum_key only checks the alg,
+            # exp and sub claims and verifies no signature, so it is cheaper than a thread hop
+            verified_data = self._verify_token_signature(token, public_key, algorithm)
+        else:
+            # Asymmetric signature checks release the GIL, so run them in worker threads
+            async with _VERIFY_SEMAPHORE:
+                verified_data = await asyncio.to_thread(self._verify_token_signature, token, public_key, algorithm)
+        
+        # Only tokens with an expiry can be cached safely
+        exp = verified_data.get('exp') if isinstance(verified_data, dict) else None
+        if isinstance(exp, (int, float)):
+            self._remember_token(cache_key, float(exp), verified_data)
+            ttl = int(min(exp - time.time(), SHARED_TOKEN_CACHE_TTL))
+            if redis_key and ttl > 0:
+                await self.redis_client.setex(redis_key, ttl, orjson.dumps(verified_data))
+        
+        return verified_data
+    
+    def _remember_token(self, cache_key: Tuple[bytes, str, str], exp: float, claims: Dict[str, Any]) -> None:
+        """Add verified claims to this agent's token LRU, evicting the oldest entry when full."""
+        self._verified_token_cache[cache_key] = (exp, dict(claims))
+        if len(self._verified_token_cache) > VERIFIED_TOKEN_CACHE_SIZE:
+            self._verified_token_cache.popitem(last=False)
+    
+    def _verify_token_signature(self, token: str, public_key: Optional[str], algorithm: str) -> Dict[str, Any]:
+        """Verify a JWT token's signature and claims using the provided public key."""
         try:
-            logger.info(f"[{self.name}] Verifying token with algorithm={algorithm}, public_key={public_key[:10] if public_key else 'None'}...")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[%s] Verifying token with algorithm=%s, public_key=%s...", self.name, algorithm, public_key[:10] if public_key else 'None')
             
             if not public_key:
                 raise ValueError("No verification key provided")
@@ -182,22 +378,15 @@ class BaseAgent(ABC):
                 # For Ethereum JWT verification, we need the expected DID
                 # Extract DID from the token or use a default
                 try:
-                    # Try to decode the token to get the subject (DID)
-                    import base64
-                    import json
-                    parts = token.split('.')
-                    if len(parts) >= 2:
-                        payload_encoded = parts[1]
-                        # Add padding if needed
-                        payload_encoded += '=' * (4 - len(payload_encoded) % 4)
-                        payload = json.loads(base64.urlsafe_b64decode(payload_encoded))
-                        expected_did = payload.get('sub', '')
-                    else:
+                    # Read the subject (DID) from the unverified payload
+                    try:
+                        expected_did = _peek_jwt_sub(token)
+                    except jwt.DecodeError:
                         expected_did = self.did  # Fallback to own DID
                     
                     # Use Ethereum JWT verification
                     verified_data = verify_jwt_with_ethereum_key(token, expected_did, public_key)
-                    logger.info(f"[{self.name}] Ethereum JWT token verified successfully")
+                    logger.info("[%s] Ethereum JWT token verified successfully", self.name)
                     return verified_data
                     
                 except Exception as e:
@@ -207,7 +396,7 @@ class BaseAgent(ABC):
                 # Fallback to standard JWT for other algorithms
                 try:
                     decoded = jwt.decode(token, public_key, algorithms=[algorithm])
-                    logger.info(f"[{self.name}] Standard JWT token verified successfully")
+                    logger.info("[%s] Standard JWT token verified successfully", self.name)
                     return decoded
                 except jwt.InvalidSignatureError as e:
                     logger.error(f"[{self.name}] Invalid signature: {str(e)}")
@@ -226,18 +415,18 @@ class BaseAgent(ABC):
     async def create_token(self, recipient_did: str, message_type: str, payload: Optional[Dict[str, Any]] = None) -> str:
         """Create a JWT token for agent-to-agent communication."""
         try:
-            # Get private key from registry
-            normalized_did = self.did.replace('did:ethr:', 'did:eth:')
-            private_key = did_registry.get_private_key(normalized_did)
+            # Get private key (resolved at init, or from the registry if registered since)
+            private_key = self._get_private_key()
             if not private_key:
                 raise ValueError(f"No private key found for DID: {self.did}")
             
-            # Create base payload
+            # Create base payload (one clock read so iat and exp stay consistent)
+            now = int(time.time())
             base_payload = {
                 "sub": self.did,
                 "aud": recipient_did,
-                "iat": int(datetime.utcnow().timestamp()),
-                "exp": int(datetime.utcnow().timestamp()) + 3600,  # 1 hour expiration
+                "iat": now,
+                "exp": now + 3600,  # 1 hour expiration
                 "role": "agent",
                 "type": message_type
             }
@@ -256,15 +445,46 @@ class BaseAgent(ABC):
     
     def get_credentials(self) -> Dict[str, Any]:
         """Get agent's verifiable credentials."""
-        normalized_did = self.did.replace('did:ethr:', 'did:eth:')
-        public_key = did_registry.get(normalized_did)
-        return {
-            'did': self.did,
-            'name': self.name,
-            'type': self.__class__.__name__,
-            'public_key': public_key,
-            'timestamp': datetime.utcnow().isoformat()
-        }
+        credentials = self._credentials
+        if credentials is None:
+            credentials = {
+                'did': self.did,
+                'name': self.name,
+                'type': self.__class__.__name__,
+                'public_key': self._get_public_key()
+            }
+            if credentials['public_key']:
+                self._credentials = credentials
+        return {**credentials, 'timestamp': request_timestamp()}
+    
+    def invalidate_credentials(self) -> None:
+        """Drop cached keys and credentials after a key rotation."""
+        self._private_key = None
+        self._public_key = None
+        self._credentials = None
+        _PUBLIC_KEY_CACHE.clear()
+    
+    def lookup_public_key(self, did: str) -> Optional[str]:
+        """Get another agent's public key from the registry, caching successful lookups."""
+        return _lookup_public_key(_normalize_did(did))
+    
+    async def close(self) -> None:
+        """Release this agent's Redis client."""
+        if self.redis_client:
+            await self.redis_client.aclose()
+            self.redis_client = None
+    
+    def _get_private_key(self) -> Optional[str]:
+        """Get this agent's private key, resolving it if it was not registered at init."""
+        if not self._private_key:
+            self._private_key = did_registry.get_private_key(self._normalized_did)
+        return self._private_key
+    
+    def _get_public_key(self) -> Optional[str]:
+        """Get this agent's public key, resolving it if it was not registered at init."""
+        if not self._public_key:
+            self._public_key = did_registry.get(self._normalized_did)
+        return self._public_key
     
     @abstractmethod
     async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
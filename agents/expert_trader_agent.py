@@ -2,18 +2,36 @@
 Expert Trader Agent module for analyzing trading requests
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+import asyncio
 import logging
-from datetime import datetime
-from .base_agent import BaseAgent, AgentMessage
+import os
+import time
+import orjson
+from .base_agent import BaseAgent, AgentMessage, REQUIRED_MESSAGE_FIELDS
+from .request_context import request_scope, request_timestamp
 from backend.agent_registry import agent_registry, AgentRole
-from backend.did_registry import did_registry
-from agents.trading_tools import MarketAnalysisTool, RiskAssessmentTool
+from agents.trading_tools import MARKET_TOOL, RISK_TOOL
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of trading requests that arrived without any assets
+_empty_assets_total = 0
+
+def _error_response(message: str) -> Dict[str, Any]:
+    """Build the error response returned by process_message"""
+    return {'status': 'error', 'message': message}
+
+# Seconds a market analysis is reused for identical (assets, interval) requests
+MARKET_CACHE_TTL = float(os.getenv("MARKET_CACHE_TTL", 60))
+
+def _debug_dump(label: str, obj: Any) -> None:
+    """Log a pretty-printed payload at DEBUG, serializing only when DEBUG is enabled"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[ExpertTraderAgent] %s:\n%s", label, orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str).decode())
+
 class ExpertTraderAgent(BaseAgent):
     """Expert trader agent for analyzing trading requests"""
     
@@ -21,150 +39,118 @@ class ExpertTraderAgent(BaseAgent):
         """Initialize the expert trader agent with a DID"""
         super().__init__(did=did, name="ExpertTrader")
         logger.info(f"Initialized Expert Trader Agent with DID: {did}")
-        self.market_tool = MarketAnalysisTool()
-        self.risk_tool = RiskAssessmentTool()
+        self.market_tool = MARKET_TOOL
+        self.risk_tool = RISK_TOOL
+        # Recent market analyses: {(assets, interval): (expires_at, analysis JSON)}
+        self._mkt_cache: Dict[Tuple[Tuple[str, ...], str], Tuple[float, str]] = {}
+        # One lock per key so concurrent misses share a single upstream call, kept
+        # only while some request holds or waits on it
+        self._mkt_cache_locks: Dict[Tuple[Tuple[str, ...], str], asyncio.Lock] = {}
+        self._mkt_cache_lock_users: Dict[Tuple[Tuple[str, ...], str], int] = {}
     
     async def process_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """Process incoming messages and analyze trading requests. Requires ask_id for session tracking."""
-        try:
-            ask_id = message.get('ask_id')
-            sender_did = message.get('sender_did')
-            sender_token = message.get('token')
-            sender_public_key = message.get('public_key')
-            
-            if not ask_id or not sender_did or not sender_token or not sender_public_key:
-                return {
-                    'status': 'error',
-                    'message': 'Missing ask_id, sender_did, token, or public_key'
-                }
-            
-            # Verify sender for this ask/session
-            if not self.is_verified(ask_id, sender_did):
-                verification_result = await self.verify_agent(ask_id, sender_did, sender_token, sender_public_key)
-                if not verification_result.get("verified", False):
-                    return {
-                        'status': 'error',
-                        'message': verification_result.get("message", "DID/JWT verification failed")
-                    }
-            
-            if message.get('type') == 'trading_request':
+        with request_scope():
+            try:
                 try:
-                    # Get the verified public key for this session
-                    verified_public_key = self.get_verified_public_key(ask_id, sender_did)
-                    if not verified_public_key:
+                    ask_id, sender_did, sender_token, sender_public_key = REQUIRED_MESSAGE_FIELDS(message)
+                except KeyError as e:
+                    return _error_response(f'Missing {e.args[0]}')
+                
+                if not all((ask_id, sender_did, sender_token, sender_public_key)):
+                    return _error_response('Missing ask_id, sender_did, token, or public_key')
+                
+                # Verify sender for this ask/session
+                if not await self.is_verified(ask_id, sender_did):
+                    verification_result = await self.verify_agent(ask_id, sender_did, sender_token, sender_public_key)
+                    if not verification_result.get("verified", False):
+                        return _error_response(verification_result.get("message", "DID/JWT verification failed"))
+                
+                if message.get('type') == 'trading_request':
+                    try:
+                        # Get the verified public key for this session
+                        verified_public_key = await self.get_verified_public_key(ask_id, sender_did)
+                        if not verified_public_key:
+                            return _error_response('No verified public key found for sender')
+                        
+                        # Verify token and extract trading request
+                        verified_data = await self.verify_token(sender_token, verified_public_key)
+                        if not verified_data:
+                            return _error_response('Token verification failed')
+                        
+                        # Process the trading request
+                        analysis = await self._analyze_trading_request(verified_data)
+                        
+                        # Create response token
+                        response_token = await self.create_token(
+                            recipient_did=sender_did,  # This is the orchestrator's DID
+                            message_type="trading_analysis",
+                            payload={
+                                "analysis": analysis,
+                                "ask_id": ask_id
+                            }
+                        )
+                        
+                        # End session after ask is complete
+                        await self.end_ask(ask_id)
+                        
+                        # Get my credentials for the response
+                        credentials = self.get_credentials()
+                        
+                        # Get orchestrator's public key from the registry using the orchestrator's DID
+                        # The sender_did is the orchestrator's DID since it's sending the request
+                        orchestrator_public_key = self.lookup_public_key(sender_did)
+                        
+                        if not orchestrator_public_key:
+                            logger.error(f"[ExpertAgent] No public key found for orchestrator DID: {sender_did}")
+                            return _error_response('Orchestrator public key not found')
+                        
                         return {
-                            'status': 'error',
-                            'message': 'No verified public key found for sender'
+                            'status': 'success',
+                            'message': 'Trading analysis completed',
+                            'analysis': analysis,
+                            'credentials': credentials,
+                            'token': response_token,
+                            'public_key': orchestrator_public_key  # Include orchestrator's public key
                         }
-                    
-                    # Verify token and extract trading request
-                    verified_data = await self.verify_token(sender_token, verified_public_key)
-                    if not verified_data:
-                        return {
-                            'status': 'error',
-                            'message': 'Token verification failed'
-                        }
-                    
-                    # Process the trading request
-                    analysis = await self._analyze_trading_request(verified_data)
-                    
-                    # Create response token
-                    response_token = await self.create_token(
-                        recipient_did=sender_did,  # This is the orchestrator's DID
-                        message_type="trading_analysis",
-                        payload={
-                            "analysis": analysis,
-                            "ask_id": ask_id
-                        }
-                    )
-                    
-                    # End session after ask is complete
-                    self.end_ask(ask_id)
-                    
-                    # Get my credentials for the response
-                    credentials = self.get_credentials()
-                    
-                    # Get orchestrator's public key from the registry using the orchestrator's DID
-                    # The sender_did is the orchestrator's DID since it's sending the request
-                    orchestrator_public_key = did_registry.get(sender_did)
-                    
-                    if not orchestrator_public_key:
-                        logger.error(f"[ExpertAgent] No public key found for orchestrator DID: {sender_did}")
-                        return {
-                            'status': 'error',
-                            'message': 'Orchestrator public key not found'
-                        }
-                    
-                    return {
-                        'status': 'success',
-                        'message': 'Trading analysis completed',
-                        'analysis': analysis,
-                        'credentials': credentials,
-                        'token': response_token,
-                        'public_key': orchestrator_public_key  # Include orchestrator's public key
-                    }
-                    
-                except ValueError as e:
-                    return {
-                        'status': 'error',
-                        'message': str(e)
-                    }
-            
-            return {
-                'status': 'error',
-                'message': 'Invalid message type'
-            }
-            
-        except Exception as e:
-            logger.error(f"Error processing message: {e}", exc_info=True)
-            return {
-                'status': 'error',
-                'message': str(e)
-            }
+                        
+                    except ValueError as e:
+                        return _error_response(str(e))
+                
+                return _error_response('Invalid message type')
+                
+            except Exception as e:
+                logger.error(f"Error processing message: {e}", exc_info=True)
+                return _error_response(str(e))
     
     async def _analyze_trading_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze a trading request and provide recommendations"""
+        now_iso = request_timestamp()
         try:
-            import json
-            logger.info(f"[ExpertTraderAgent] Received request: {json.dumps(request, indent=2)}")
-            
-            # COMPREHENSIVE LOGGING: Log the expert agent processing
-            print("=" * 80)
-            print("🧠 EXPERT AGENT: ANALYZING TRADING REQUEST")
-            print("=" * 80)
-            print(f"Request: {json.dumps(request, indent=2)}")
-            
-            # Extract request details
-            goals = request.get('goals', {})
-            constraints = request.get('constraints', {})
+            logger.info("[ExpertTraderAgent] Received request: %s", request)
+            _debug_dump("Analyzing trading request", request)
             
-            # Extract assets from multiple possible locations
-            assets = []
-            if isinstance(goals, dict):
-                assets = goals.get('assets', [])
-            if not assets and isinstance(constraints, dict):
-                assets = constraints.get('allowed_assets', [])
+            # Extract request details, treating anything but a dict as empty
+            goals = request.get('goals')
+            if not isinstance(goals, dict):
+                goals = {}
+            constraints = request.get('constraints')
+            if not isinstance(constraints, dict):
+                constraints = {}
             
-            # Ensure assets is a list
-            if not isinstance(assets, list):
-                if isinstance(assets, str):
-                    assets = [assets]
-                else:
-                    assets = []
+            # Extract assets from multiple possible locations, as a list
+            assets = goals.get('assets') or constraints.get('allowed_assets') or []
+            assets = [assets] if isinstance(assets, str) else (assets if isinstance(assets, list) else [])
             
-            position_size = goals.get('position_size', 0.1) if isinstance(goals, dict) else 0.1
-            stop_loss = constraints.get('stop_loss', 0.05) if isinstance(constraints, dict) else 0.05
-            take_profit = constraints.get('take_profit', 0.1) if isinstance(constraints, dict) else 0.1
+            position_size = goals.get('position_size', 0.1)
+            stop_loss = constraints.get('stop_loss', 0.05)
+            take_profit = constraints.get('take_profit', 0.1)
             
-            print(f"Extracted Goals: {goals}")
-            print(f"Extracted Constraints: {constraints}")
-            print(f"Extracted Assets: {assets}")
-            print(f"Position Size: {position_size}")
-            print(f"Stop Loss: {stop_loss}")
-            print(f"Take Profit: {take_profit}")
-            print("=" * 80)
-            
-            logger.info(f"[ExpertTraderAgent] Extracted assets: {assets}")
+            logger.debug(
+                "[ExpertTraderAgent] Extracted goals=%s constraints=%s position_size=%s stop_loss=%s take_profit=%s",
+                goals, constraints, position_size, stop_loss, take_profit
+            )
+            logger.info("[ExpertTraderAgent] Extracted assets: %s", assets)
             
             # Create strategy with user assets
             strategy = {
@@ -173,44 +159,40 @@ class ExpertTraderAgent(BaseAgent):
                 "stop_loss": stop_loss,
                 "take_profit": take_profit
             }
+            _debug_dump("Created strategy", strategy)
             
-            # COMPREHENSIVE LOGGING: Log strategy creation
-            print("=" * 80)
-            print("🧠 EXPERT AGENT: CREATED STRATEGY")
-            print("=" * 80)
-            print(f"Strategy: {json.dumps(strategy, indent=2)}")
-            print("=" * 80)
+            # Nothing to analyze without assets, so skip the market tool entirely
+            if not assets:
+                global _empty_assets_total
+                _empty_assets_total += 1
+                logger.warning(
+                    "[ExpertTraderAgent] No assets in trading request (expert_agent_empty_assets_total=%d)",
+                    _empty_assets_total
+                )
+                return {
+                    "market_analysis": {},
+                    "strategy": strategy,
+                    "recommendations": [],
+                    "timestamp": now_iso
+                }
             
             # Get market analysis using user assets
             market_analysis = await self._get_market_analysis(strategy)
-            
-            # COMPREHENSIVE LOGGING: Log market analysis
-            print("=" * 80)
-            print("🧠 EXPERT AGENT: MARKET ANALYSIS RESULT")
-            print("=" * 80)
-            print(f"Market Analysis: {json.dumps(market_analysis, indent=2)}")
-            print("=" * 80)
+            _debug_dump("Market analysis result", market_analysis)
             
             # Create comprehensive analysis
             analysis = {
                 "market_analysis": market_analysis,
                 "strategy": strategy,
                 "recommendations": self._generate_recommendations(strategy, market_analysis),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_iso
             }
-            
-            # COMPREHENSIVE LOGGING: Log final analysis
-            print("=" * 80)
-            print("🧠 EXPERT AGENT: FINAL ANALYSIS")
-            print("=" * 80)
-            print(f"Final Analysis: {json.dumps(analysis, indent=2)}")
-            print("=" * 80)
+            _debug_dump("Final analysis", analysis)
             
             return analysis
             
         except Exception as e:
             logger.error(f"[ExpertTraderAgent] Error in _analyze_trading_request: {str(e)}")
-            print(f"❌ EXPERT AGENT ERROR: {str(e)}")
             raise
 
     async def _get_market_analysis(self, strategy: Dict[str, Any]) -> Dict[str, Any]:
@@ -221,40 +203,66 @@ class ExpertTraderAgent(BaseAgent):
                 logger.warning("[ExpertTraderAgent] No assets provided for market analysis")
                 return {}
             
-            # Perform real market analysis
-            market_analysis_json = await self.market_tool._arun(assets, "1d")
-            market_analysis = None
-            try:
-                import json
-                market_analysis = json.loads(market_analysis_json)
-            except Exception as e:
-                logger.error(f"[ExpertTraderAgent] Error parsing market analysis JSON: {e}")
-                market_analysis = {"error": str(e)}
-            
-            return market_analysis
+            return await self._cached_market_analysis(assets, "1d")
             
         except Exception as e:
             logger.error(f"[ExpertTraderAgent] Error in _get_market_analysis: {str(e)}")
             return {"error": str(e)}
 
+    async def _cached_market_analysis(self, assets: List[str], interval: str) -> Dict[str, Any]:
+        """Run the market analysis tool, reusing results for identical requests within the TTL"""
+        # The cache holds the tool's JSON, so every caller gets its own parsed copy
+        key = (tuple(sorted(assets)), interval)
+        cached = self._mkt_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return orjson.loads(cached[1])
+        
+        lock = self._mkt_cache_locks.get(key)
+        if lock is None:
+            lock = self._mkt_cache_locks[key] = asyncio.Lock()
+        self._mkt_cache_lock_users[key] = self._mkt_cache_lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                # Another request may have filled the cache while we waited
+                cached = self._mkt_cache.get(key)
+                if cached and cached[0] > time.monotonic():
+                    return orjson.loads(cached[1])
+                
+                # Perform real market analysis
+                market_analysis_json = await self.market_tool._arun(assets, interval)
+                try:
+                    market_analysis = orjson.loads(market_analysis_json)
+                except Exception as e:
+                    logger.error(f"[ExpertTraderAgent] Error parsing market analysis JSON: {e}")
+                    return {"error": str(e)}
+                
+                # Only reuse analyses where the tool and every asset succeeded
+                if "error" not in market_analysis and not any(
+                    isinstance(analysis, dict) and "error" in analysis for analysis in market_analysis.values()
+                ):
+                    now = time.monotonic()
+                    self._mkt_cache = {k: v for k, v in self._mkt_cache.items() if v[0] > now}
+                    self._mkt_cache[key] = (now + MARKET_CACHE_TTL, market_analysis_json)
+                return market_analysis
+        finally:
+            # Drop the lock once no other request is waiting on it
+            users = self._mkt_cache_lock_users.pop(key) - 1
+            if users:
+                self._mkt_cache_lock_users[key] = users
+            else:
+                del self._mkt_cache_locks[key]
+    
     def _generate_recommendations(self, strategy: Dict[str, Any], market_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generate recommendations based on strategy and market analysis"""
-        try:
-            recommendations = []
-            
-            for asset, analysis in (market_analysis or {}).items():
-                if isinstance(analysis, dict) and analysis.get("recommendations"):
-                    for rec in analysis["recommendations"]:
-                        recommendations.append({
-                            "asset": asset,
-                            "recommendation": rec
-                        })
-            
-            return recommendations
-            
-        except Exception as e:
-            logger.error(f"[ExpertTraderAgent] Error in _generate_recommendations: {str(e)}")
+        if not market_analysis or not isinstance(market_analysis, dict):
             return []
+        
+        return [
+            {"asset": asset, "recommendation": rec}
+            for asset, analysis in market_analysis.items()
+            if isinstance(analysis, dict)
+            for rec in (analysis.get("recommendations") or ())
+        ]
 
 # Initialize expert agent with normalized DID
 expert_agent = ExpertTraderAgent(did="did:eth:0x3990762F90777172Af4A203225EAb3e8813b8030")
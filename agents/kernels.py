@@ -0,0 +1,63 @@
+"""
+Compiled numeric kernels used by the trading tools
+"""
+
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+except ImportError:
+    logger.warning("numba not installed, numeric kernels will run as plain Python")
+    
+    def njit(*args, **kwargs):
+        """Fallback for numba.njit that returns the function unchanged."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+@njit("Tuple((float64[:], float64[:], float64[:]))(float64[:], int64, int64, int64, int64)", cache=True, nogil=True)
+def rsi_macd(close: np.ndarray, rsi_period: int, fast: int, slow: int, signal: int):
+    """RSI, MACD and MACD signal line for a price series in one pass.
+    
+    Matches the pandas formulation used by the tools: RSI averages gains and losses
+    with a simple rolling mean, and EMAs use ewm(span=...).mean()'s adjusted weights.
+    """
+    n = close.shape[0]
+    rsi = np.full(n, np.nan)
+    macd = np.empty(n)
+    macd_signal = np.empty(n)
+    
+    decay_fast = 1.0 - 2.0 / (fast + 1.0)
+    decay_slow = 1.0 - 2.0 / (slow + 1.0)
+    decay_signal = 1.0 - 2.0 / (signal + 1.0)
+    num_fast = den_fast = num_slow = den_slow = num_signal = den_signal = 0.0
+    
+    for i in range(n):
+        # Adjusted EMA: weighted sum of all prior values over the sum of the weights
+        num_fast = close[i] + decay_fast * num_fast
+        den_fast = 1.0 + decay_fast * den_fast
+        num_slow = close[i] + decay_slow * num_slow
+        den_slow = 1.0 + decay_slow * den_slow
+        macd[i] = num_fast / den_fast - num_slow / den_slow
+        num_signal = macd[i] + decay_signal * num_signal
+        den_signal = 1.0 + decay_signal * den_signal
+        macd_signal[i] = num_signal / den_signal
+        
+        if i >= rsi_period - 1:
+            # The first price has no change, which pandas counts as zero
+            gain = 0.0
+            loss = 0.0
+            for j in range(max(i - rsi_period + 1, 1), i + 1):
+                delta = close[j] - close[j - 1]
+                if delta > 0:
+                    gain += delta
+                else:
+                    loss -= delta
+            if loss > 0:
+                rsi[i] = 100.0 - 100.0 / (1.0 + gain / loss)
+            elif gain > 0:
+                rsi[i] = 100.0
+    return rsi, macd, macd_signal
@@ -0,0 +1,33 @@
+"""
+Request-scoped context shared by agent handlers
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Iterator, Optional
+
+# ISO timestamp of the request currently being handled
+REQUEST_TS: ContextVar[Optional[str]] = ContextVar("REQUEST_TS", default=None)
+
+def request_timestamp() -> str:
+    """Get the current request's timestamp, or the current time outside a request."""
+    timestamp = REQUEST_TS.get()
+    return timestamp if timestamp is not None else datetime.utcnow().isoformat()
+
+@contextmanager
+def request_scope() -> Iterator[str]:
+    """Fix the request timestamp for the duration of a handler.
+    
+    Nested scopes reuse the outer request's timestamp.
+    """
+    timestamp = REQUEST_TS.get()
+    if timestamp is not None:
+        yield timestamp
+        return
+    
+    token = REQUEST_TS.set(datetime.utcnow().isoformat())
+    try:
+        yield REQUEST_TS.get()
+    finally:
+        REQUEST_TS.reset(token)
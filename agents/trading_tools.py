@@ -1,165 +1,272 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
 from langchain_community.tools import BaseTool
-from datetime import datetime, timedelta
-import json
+import orjson
+from .request_context import request_timestamp
+from .kernels import rsi_macd
 import numpy as np
 import pandas as pd
 import yfinance as yf
 from scipy import stats
+import httpx
 import warnings
 warnings.filterwarnings('ignore')
 
+# Shared keep-alive client for market data and trading platform APIs, so
+# tool calls reuse pooled connections instead of a new TLS handshake each
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client used by the tools' async entry points."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+    return _CLIENT
+
+async def close_client() -> None:
+    """Close the shared HTTP client if it was created."""
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+# Seconds downloaded price history is reused across tool calls, and the
+# maximum number of (ticker, period) histories kept
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", 300))
+HISTORY_CACHE_SIZE = 512
+
+# Price history: {(ticker, period): (expires_at, frame)}, LRU ordered. Tools run
+# in worker threads, so access is guarded by a lock
+_HISTORY_CACHE: "OrderedDict[Tuple[str, str], Tuple[float, pd.DataFrame]]" = OrderedDict()
+_HISTORY_CACHE_LOCK = threading.Lock()
+
+# yf.download collects results in module-global state, so only one download may run at a time
+_DOWNLOAD_LOCK = threading.Lock()
+
+_DUMPS_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _dumps(obj: Any) -> str:
+    """Serialize a tool result as indented JSON, encoding NumPy scalars natively."""
+    return orjson.dumps(obj, option=_DUMPS_OPTIONS).decode()
+
+def _dumps_items(items: Iterable[Tuple[str, Any]]) -> str:
+    """Serialize (key, value) pairs as one JSON object, encoding each value as it is produced.
+    
+    The output is identical to _dumps() on the equivalent dict, but values don't all
+    need to be held in memory alongside the encoded result.
+    """
+    buf = bytearray()
+    for key, value in items:
+        buf += b',\n  ' if buf else b'{\n  '
+        # Nest the value one level deep; JSON strings never contain raw newlines
+        buf += orjson.dumps(str(key)) + b': ' + orjson.dumps(value, option=_DUMPS_OPTIONS).replace(b'\n', b'\n  ')
+    return (buf + b'\n}').decode() if buf else '{}'
+
+def _fill_from_cache(tickers: List[str], period: str, histories: Dict[str, pd.DataFrame]) -> None:
+    """Add the unexpired cached histories of tickers to histories."""
+    now = time.monotonic()
+    with _HISTORY_CACHE_LOCK:
+        for ticker in tickers:
+            cached = _HISTORY_CACHE.get((ticker, period))
+            if cached and cached[0] > now:
+                _HISTORY_CACHE.move_to_end((ticker, period))
+                histories[ticker] = cached[1]
+
+def _download_history(assets: List[str], period: str = "1y") -> Dict[str, pd.DataFrame]:
+    """Get price history for several tickers, downloading any not cached in one request."""
+    tickers = list(dict.fromkeys(assets))
+    histories = {}
+    _fill_from_cache(tickers, period, histories)
+    
+    missing = [ticker for ticker in tickers if ticker not in histories]
+    if not missing:
+        return histories
+    
+    with _DOWNLOAD_LOCK:
+        # Another caller may have downloaded some of these while we waited
+        _fill_from_cache(missing, period, histories)
+        missing = [ticker for ticker in missing if ticker not in histories]
+        if not missing:
+            return histories
+        
+        data = yf.download(missing, period=period, group_by='ticker', auto_adjust=True,
+                           threads=True, progress=False)
+        for ticker in missing:
+            if isinstance(data.columns, pd.MultiIndex):
+                hist = data[ticker] if ticker in data.columns.get_level_values(0) else pd.DataFrame()
+            else:
+                # Older yfinance versions return flat columns for a single ticker
+                hist = data
+            # Tickers with no data map to an empty frame, as Ticker.history returns
+            histories[ticker] = hist.dropna(how='all')
+        
+        # Fill the cache before releasing the download lock, so waiting callers find it
+        expires_at = time.monotonic() + HISTORY_CACHE_TTL
+        with _HISTORY_CACHE_LOCK:
+            for ticker in missing:
+                # Don't cache failed lookups, so a transient error isn't repeated for the TTL
+                if not histories[ticker].empty:
+                    _HISTORY_CACHE[(ticker, period)] = (expires_at, histories[ticker])
+                    _HISTORY_CACHE.move_to_end((ticker, period))
+            while len(_HISTORY_CACHE) > HISTORY_CACHE_SIZE:
+                _HISTORY_CACHE.popitem(last=False)
+    return histories
+
 class MarketAnalysisTool(BaseTool):
     name: str = "market_analysis"
     description: str = "Analyze market conditions and trends for given assets using quantitative methods"
     
     def _run(self, assets: List[str], timeframe: str = "1d") -> str:
         """Analyze market conditions and trends for given assets."""
-        import json  # Move import to top of function
-        
         try:
-            # COMPREHENSIVE LOGGING: Log the market analysis tool processing
-            print("=" * 80)
-            print("📊 MARKET TOOL: PROCESSING MARKET ANALYSIS")
-            print("=" * 80)
-            print(f"Input Assets: {assets}")
-            print(f"Input Timeframe: {timeframe}")
-            
-            # Ensure assets is a list
-            if not isinstance(assets, list):
-                if isinstance(assets, str):
-                    assets = [assets]
-                else:
-                    assets = []
-            
-            # Only fallback to BTC/ETH if no assets are provided at all
-            if not assets:
-                assets = ["BTC", "ETH"]
-            
-            print(f"Processed Assets: {assets}")
-            print("=" * 80)
-            
-            analysis = {}
-            
-            for asset in assets:
-                # Get historical data
-                ticker = yf.Ticker(asset)
-                hist = ticker.history(period="1y")
-                
-                if hist.empty:
-                    analysis[asset] = {"error": f"No data available for {asset}"}
-                    continue
-                
-                # Calculate basic statistics
-                returns = hist['Close'].pct_change().dropna()
-                current_price = hist['Close'].iloc[-1]
-                mean_return = returns.mean()
-                volatility = returns.std()
-                skewness = returns.skew()
-                kurtosis = returns.kurtosis()
-                
-                # Calculate VaR and max drawdown
-                var_95 = np.percentile(returns, 5)
-                max_drawdown = self._calculate_max_drawdown(hist['Close'])
-                
-                # Technical indicators
-                rsi = self._calculate_rsi(hist['Close']).iloc[-1]
-                macd, macd_signal = self._calculate_macd(hist['Close'])
-                macd_value = macd.iloc[-1]
-                macd_signal_value = macd_signal.iloc[-1]
-                
-                # Moving averages
-                sma_20 = hist['Close'].rolling(window=20).mean().iloc[-1]
-                sma_50 = hist['Close'].rolling(window=50).mean().iloc[-1]
-                
-                # Trend analysis
-                trend_direction = "bullish" if sma_20 > sma_50 else "bearish"
-                price_vs_sma20 = "above" if current_price > sma_20 else "below"
-                
-                # Volatility analysis
-                current_volatility = returns.tail(30).std()  # Recent volatility
-                volatility_percentile = (returns < current_volatility).mean()
-                
-                if volatility_percentile < 0.25:
-                    volatility_regime = "low"
-                elif volatility_percentile < 0.75:
-                    volatility_regime = "normal"
-                else:
-                    volatility_regime = "high"
-                
-                # Generate recommendations
-                recommendations = self._generate_recommendations(
-                    mean_return, volatility, rsi, sma_20, sma_50, current_price
-                )
-                
-                analysis[asset] = {
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "current_price": float(current_price),
-                    "statistical_metrics": {
-                        "mean_return": float(mean_return),
-                        "volatility": float(volatility),
-                        "skewness": float(skewness),
-                        "kurtosis": float(kurtosis),
-                        "var_95": float(var_95),
-                        "max_drawdown": float(max_drawdown)
-                    },
-                    "trend_analysis": {
-                        "sma_20": float(sma_20),
-                        "sma_50": float(sma_50),
-                        "trend_direction": trend_direction,
-                        "price_vs_sma20": price_vs_sma20
-                    },
-                    "technical_indicators": {
-                        "rsi": float(rsi),
-                        "macd": float(macd_value),
-                        "macd_signal": float(macd_signal_value)
-                    },
-                    "volatility_analysis": {
-                        "current_volatility": float(current_volatility),
-                        "volatility_percentile": float(volatility_percentile),
-                        "volatility_regime": volatility_regime
-                    },
-                    "recommendations": recommendations
-                }
-            
-            result = json.dumps(analysis, indent=2)
-            
-            # COMPREHENSIVE LOGGING: Log the market analysis tool result
-            print("=" * 80)
-            print("📊 MARKET TOOL: MARKET ANALYSIS RESULT")
-            print("=" * 80)
-            print(f"Result: {result}")
-            print("=" * 80)
-            
-            return result
+            assets = self._prepare_assets(assets, timeframe)
+            now_iso = request_timestamp()
+            histories = _download_history(assets)
+            # Analyze lazily so each asset is encoded before the next is built
+            analysis = ((asset, self._analyze_asset(asset, histories[asset], now_iso)) for asset in dict.fromkeys(assets))
+            return self._format_result(analysis)
             
         except Exception as e:
-            error_result = json.dumps({"error": f"Market analysis failed: {str(e)}"})
-            print(f"❌ MARKET TOOL ERROR: {str(e)}")
-            return error_result
+            return self._format_error(e)
     
-    def _calculate_rsi(self, prices: pd.Series, period: int = 14) -> pd.Series:
-        """Calculate Relative Strength Index."""
-        delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
+    def _prepare_assets(self, assets: List[str], timeframe: str) -> List[str]:
+        """Normalize the requested assets to a non-empty list."""
+        # COMPREHENSIVE LOGGING: Log the market analysis tool processing
+        print("=" * 80)
+        print("📊 MARKET TOOL: PROCESSING MARKET ANALYSIS")
+        print("=" * 80)
+        print(f"Input Assets: {assets}")
+        print(f"Input Timeframe: {timeframe}")
+        
+        # Ensure assets is a list
+        if not isinstance(assets, list):
+            if isinstance(assets, str):
+                assets = [assets]
+            else:
+                assets = []
+        
+        # Only fallback to BTC/ETH if no assets are provided at all
+        if not assets:
+            assets = ["BTC", "ETH"]
+        
+        print(f"Processed Assets: {assets}")
+        print("=" * 80)
+        return assets
     
-    def _calculate_macd(self, prices: pd.Series, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple:
-        """Calculate MACD and signal line."""
-        ema_fast = prices.ewm(span=fast).mean()
-        ema_slow = prices.ewm(span=slow).mean()
-        macd = ema_fast - ema_slow
-        signal_line = macd.ewm(span=signal).mean()
-        return macd, signal_line
+    def _analyze_asset(self, asset: str, hist: pd.DataFrame, now_iso: str) -> Dict[str, Any]:
+        """Analyze one asset's price history."""
+        if hist.empty:
+            return {"error": f"No data available for {asset}"}
+        
+        # Work on the closing prices as a plain array; the copy is writable for the kernels
+        close = hist['Close'].to_numpy(dtype=np.float64, copy=True)
+        
+        # Calculate basic statistics (sample moments, as pandas computes them)
+        returns = np.diff(close) / close[:-1]
+        returns = returns[~np.isnan(returns)]
+        current_price = close[-1]
+        mean_return = returns.mean()
+        volatility = returns.std(ddof=1)
+        skewness = stats.skew(returns, bias=False)
+        kurtosis = stats.kurtosis(returns, bias=False)
+        
+        # Calculate VaR and max drawdown
+        var_95 = np.percentile(returns, 5)
+        max_drawdown = self._calculate_max_drawdown(close)
+        
+        # Technical indicators and moving averages
+        rsi, macd_value, macd_signal_value, sma_20, sma_50 = self._calculate_indicators(close)
+        
+        # Trend analysis
+        trend_direction = "bullish" if sma_20 > sma_50 else "bearish"
+        price_vs_sma20 = "above" if current_price > sma_20 else "below"
+        
+        # Volatility analysis
+        current_volatility = returns[-30:].std(ddof=1)  # Recent volatility
+        volatility_percentile = (returns < current_volatility).mean()
+        
+        if volatility_percentile < 0.25:
+            volatility_regime = "low"
+        elif volatility_percentile < 0.75:
+            volatility_regime = "normal"
+        else:
+            volatility_regime = "high"
+        
+        # Generate recommendations
+        recommendations = self._generate_recommendations(
+            mean_return, volatility, rsi, sma_20, sma_50, current_price
+        )
+        
+        return {
+            "timestamp": now_iso,
+            "current_price": current_price,
+            "statistical_metrics": {
+                "mean_return": mean_return,
+                "volatility": volatility,
+                "skewness": skewness,
+                "kurtosis": kurtosis,
+                "var_95": var_95,
+                "max_drawdown": max_drawdown
+            },
+            "trend_analysis": {
+                "sma_20": sma_20,
+                "sma_50": sma_50,
+                "trend_direction": trend_direction,
+                "price_vs_sma20": price_vs_sma20
+            },
+            "technical_indicators": {
+                "rsi": rsi,
+                "macd": macd_value,
+                "macd_signal": macd_signal_value
+            },
+            "volatility_analysis": {
+                "current_volatility": current_volatility,
+                "volatility_percentile": volatility_percentile,
+                "volatility_regime": volatility_regime
+            },
+            "recommendations": recommendations
+        }
     
-    def _calculate_max_drawdown(self, prices: pd.Series) -> float:
+    def _format_result(self, analysis: Iterable[Tuple[str, Dict[str, Any]]]) -> str:
+        """Serialize the (asset, analysis) pairs of all assets."""
+        result = _dumps_items(analysis)
+        
+        # COMPREHENSIVE LOGGING: Log the market analysis tool result
+        print("=" * 80)
+        print("📊 MARKET TOOL: MARKET ANALYSIS RESULT")
+        print("=" * 80)
+        print(f"Result: {result}")
+        print("=" * 80)
+        
+        return result
+    
+    def _format_error(self, e: Exception) -> str:
+        """Serialize a failed market analysis."""
+        error_result = orjson.dumps({"error": f"Market analysis failed: {str(e)}"}).decode()
+        print(f"❌ MARKET TOOL ERROR: {str(e)}")
+        return error_result
+    
+    def _calculate_indicators(self, prices: np.ndarray, period: int = 14, fast: int = 12,
+                              slow: int = 26, signal: int = 9) -> tuple:
+        """Calculate the latest RSI, MACD, MACD signal, 20-day SMA and 50-day SMA."""
+        rsi, macd, macd_signal = rsi_macd(prices, period, fast, slow, signal)
+        # Moving averages are undefined until a full window is available
+        sma_20 = prices[-20:].mean() if len(prices) >= 20 else np.nan
+        sma_50 = prices[-50:].mean() if len(prices) >= 50 else np.nan
+        return rsi[-1], macd[-1], macd_signal[-1], sma_20, sma_50
+    
+    def _calculate_max_drawdown(self, prices: np.ndarray) -> float:
         """Calculate maximum drawdown."""
-        peak = prices.expanding().max()
+        prices = np.asarray(prices, dtype=np.float64)
+        peak = np.fmax.accumulate(prices)
         drawdown = (prices - peak) / peak
-        return float(drawdown.min())
+        return float(np.nanmin(drawdown))
     
     def _generate_recommendations(self, mean_return: float, std_return: float, rsi: float, 
                                  sma_20: float, sma_50: float, current_price: float) -> List[str]:
@@ -191,8 +298,23 @@ class MarketAnalysisTool(BaseTool):
         return recommendations
     
     async def _arun(self, assets: List[str], timeframe: str = "1d") -> str:
-        """Async implementation of market analysis."""
-        return self._run(assets, timeframe)
+        """Async implementation of market analysis, analyzing assets concurrently."""
+        try:
+            # Analyze each asset once, as _run does
+            assets = list(dict.fromkeys(self._prepare_assets(assets, timeframe)))
+            now_iso = request_timestamp()
+            histories = await asyncio.to_thread(_download_history, assets)
+            results = await asyncio.gather(*(
+                asyncio.to_thread(self._analyze_asset, asset, histories[asset], now_iso)
+                for asset in assets
+            ))
+            return self._format_result(zip(assets, results))
+            
+        except Exception as e:
+            return self._format_error(e)
+
+# Strategy assessed when the risk tool is called without a usable one
+_DEFAULT_STRATEGY = {"assets": ["BTC", "ETH"], "position_size": 0.1, "stop_loss": 0.05, "take_profit": 0.1}
 
 class RiskAssessmentTool(BaseTool):
     name: str = "risk_assessment"
@@ -200,143 +322,191 @@ class RiskAssessmentTool(BaseTool):
     
     def _run(self, strategy: Dict[str, Any] = None, market_conditions: Dict[str, Any] = None) -> str:
         """Assess risk for a trading strategy using advanced risk metrics."""
-        import json  # Move import to top of function
-        
         try:
-            # COMPREHENSIVE LOGGING: Log the risk tool processing
-            print("=" * 80)
-            print("🔧 RISK TOOL: PROCESSING RISK ASSESSMENT")
-            print("=" * 80)
-            print(f"Input Strategy: {json.dumps(strategy, indent=2) if strategy else 'None'}")
-            print(f"Input Market Conditions: {json.dumps(market_conditions, indent=2) if market_conditions else 'None'}")
-            
-            # Handle case where arguments might be passed differently by LangChain
-            if strategy is None and market_conditions is None:
-                # Called without arguments, use defaults
-                strategy = {"assets": ["BTC", "ETH"], "position_size": 0.1, "stop_loss": 0.05, "take_profit": 0.1}
-                market_conditions = {}
-            elif isinstance(strategy, str):
-                # Called with a single string argument (might be from LangChain)
-                try:
-                    strategy = json.loads(strategy)
-                    market_conditions = {}
-                except:
-                    strategy = {"assets": ["BTC", "ETH"], "position_size": 0.1, "stop_loss": 0.05, "take_profit": 0.1}
-                    market_conditions = {}
-            elif strategy is None:
-                strategy = {"assets": ["BTC", "ETH"], "position_size": 0.1, "stop_loss": 0.05, "take_profit": 0.1}
-            elif market_conditions is None:
-                market_conditions = {}
-            
-            # Handle case where arguments are missing or empty
-            if not strategy:
-                strategy = {}
-            if not market_conditions:
-                market_conditions = {}
-            
-            # Extract strategy parameters with defaults
-            assets = strategy.get('assets', [])
-            position_size = strategy.get('position_size', 0.1)
-            stop_loss = strategy.get('stop_loss', 0.05)
-            take_profit = strategy.get('take_profit', 0.1)
-            
-            # Ensure assets is a list
-            if not isinstance(assets, list):
-                if isinstance(assets, str):
-                    assets = [assets]
-                else:
-                    assets = []
-            
-            # Only fallback to BTC/ETH if no assets are provided at all
-            if not assets:
-                assets = ["BTC", "ETH"]
-            
-            print(f"Processed Assets: {assets}")
-            print(f"Position Size: {position_size}")
-            print(f"Stop Loss: {stop_loss}")
-            print(f"Take Profit: {take_profit}")
-            print("=" * 80)
-            
-            risk_metrics = {}
-            
-            for asset in assets:
-                # Get historical data for risk calculation
-                ticker = yf.Ticker(asset)
-                hist = ticker.history(period="1y")
-                
-                if hist.empty:
-                    risk_metrics[asset] = {"error": f"No data available for {asset}"}
-                    continue
-                
-                returns = hist['Close'].pct_change().dropna()
-                current_price = hist['Close'].iloc[-1]
-                
-                # Calculate risk metrics
-                volatility = returns.std()
-                var_95 = np.percentile(returns, 5)
-                var_99 = np.percentile(returns, 1)
-                expected_shortfall = returns[returns <= var_95].mean()
-                
-                # Position-specific risk
-                position_value = current_price * position_size
-                max_loss = position_value * stop_loss
-                potential_gain = position_value * take_profit
-                
-                # Risk-adjusted metrics
-                sharpe_ratio = returns.mean() / returns.std() if returns.std() > 0 else 0
-                sortino_ratio = returns.mean() / returns[returns < 0].std() if returns[returns < 0].std() > 0 else 0
-                
-                # Correlation with market (if multiple assets)
-                if len(assets) > 1:
-                    try:
-                        market_returns = yf.Ticker("^GSPC").history(period="1y")['Close'].pct_change().dropna()
-                        correlation = returns.corr(market_returns)
-                    except:
-                        correlation = 0
-                else:
-                    correlation = 0
-                
-                risk_metrics[asset] = {
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "risk_metrics": {
-                        "volatility": float(volatility),
-                        "var_95": float(var_95),
-                        "var_99": float(var_99),
-                        "expected_shortfall": float(expected_shortfall),
-                        "sharpe_ratio": float(sharpe_ratio),
-                        "sortino_ratio": float(sortino_ratio),
-                        "market_correlation": float(correlation)
-                    },
-                    "position_risk": {
-                        "position_value": float(position_value),
-                        "max_loss": float(max_loss),
-                        "potential_gain": float(potential_gain),
-                        "risk_reward_ratio": float(potential_gain / max_loss) if max_loss > 0 else 0
-                    },
-                    "risk_assessment": {
-                        "overall_risk": self._calculate_overall_risk(volatility, var_95, correlation),
-                        "risk_level": self._categorize_risk_level(volatility, var_95),
-                        "recommendations": self._generate_risk_recommendations(
-                            volatility, var_95, sharpe_ratio, stop_loss, take_profit
-                        )
-                    }
-                }
-            
-            result = json.dumps(risk_metrics, indent=2)
-            
-            # COMPREHENSIVE LOGGING: Log the risk tool result
-            print("=" * 80)
-            print("🔧 RISK TOOL: RISK ASSESSMENT RESULT")
-            print("=" * 80)
-            print(f"Result: {result}")
-            print("=" * 80)
-            
-            return result
+            assets, position_size, stop_loss, take_profit = self._prepare_inputs(strategy, market_conditions)
+            strategy_recommendations = self._generate_strategy_recommendations(stop_loss, take_profit)
+            now_iso = request_timestamp()
+            histories, market_returns = self._load_histories(assets)
+            # Assess lazily so each asset is encoded before the next is built
+            risk_metrics = (
+                (asset, self._assess_asset(asset, histories[asset], market_returns,
+                                           position_size, stop_loss, take_profit, strategy_recommendations, now_iso))
+                for asset in dict.fromkeys(assets)
+            )
+            return self._format_result(risk_metrics)
             
         except Exception as e:
-            error_result = json.dumps({"error": f"Risk assessment failed: {str(e)}"})
-            print(f"❌ RISK TOOL ERROR: {str(e)}")
-            return error_result
+            return self._format_error(e)
+    
+    def _prepare_inputs(self, strategy: Dict[str, Any], market_conditions: Dict[str, Any]) -> tuple:
+        """Normalize the tool arguments to (assets, position_size, stop_loss, take_profit)."""
+        # COMPREHENSIVE LOGGING: Log the risk tool processing
+        print("=" * 80)
+        print("🔧 RISK TOOL: PROCESSING RISK ASSESSMENT")
+        print("=" * 80)
+        print(f"Input Strategy: {orjson.dumps(strategy, option=orjson.OPT_INDENT_2, default=str).decode() if strategy else 'None'}")
+        print(f"Input Market Conditions: {orjson.dumps(market_conditions, option=orjson.OPT_INDENT_2, default=str).decode() if market_conditions else 'None'}")
+        
+        # Handle case where arguments might be passed differently by LangChain
+        if strategy is None and market_conditions is None:
+            # Called without arguments, use defaults
+            strategy = dict(_DEFAULT_STRATEGY)
+            market_conditions = {}
+        elif isinstance(strategy, str):
+            # Called with a single string argument (might be from LangChain); only
+            # attempt to parse text that looks like JSON
+            market_conditions = {}
+            try:
+                strategy = orjson.loads(strategy) if strategy.lstrip().startswith(('{', '[')) else dict(_DEFAULT_STRATEGY)
+            except orjson.JSONDecodeError:
+                strategy = dict(_DEFAULT_STRATEGY)
+        elif strategy is None:
+            strategy = dict(_DEFAULT_STRATEGY)
+        elif market_conditions is None:
+            market_conditions = {}
+        
+        # Handle case where arguments are missing or empty
+        if not strategy:
+            strategy = {}
+        if not market_conditions:
+            market_conditions = {}
+        
+        # Extract strategy parameters with defaults
+        assets = strategy.get('assets', [])
+        position_size = strategy.get('position_size', 0.1)
+        stop_loss = strategy.get('stop_loss', 0.05)
+        take_profit = strategy.get('take_profit', 0.1)
+        
+        # Ensure assets is a list
+        if not isinstance(assets, list):
+            if isinstance(assets, str):
+                assets = [assets]
+            else:
+                assets = []
+        
+        # Only fallback to BTC/ETH if no assets are provided at all
+        if not assets:
+            assets = ["BTC", "ETH"]
+        
+        print(f"Processed Assets: {assets}")
+        print(f"Position Size: {position_size}")
+        print(f"Stop Loss: {stop_loss}")
+        print(f"Take Profit: {take_profit}")
+        print("=" * 80)
+        return assets, position_size, stop_loss, take_profit
+    
+    def _load_histories(self, assets: List[str]) -> tuple:
+        """Fetch asset histories and, when correlations are needed, market index returns."""
+        # Fetch every asset, plus the market index when correlations are needed, in one request
+        histories = _download_history(assets + ["^GSPC"] if len(assets) > 1 else assets)
+        market_returns = None
+        if len(assets) > 1 and not histories["^GSPC"].empty:
+            market_returns = histories["^GSPC"]['Close'].pct_change().dropna()
+        return histories, market_returns
+    
+    def _assess_asset(self, asset: str, hist: pd.DataFrame, market_returns: Optional[pd.Series],
+                      position_size: float, stop_loss: float, take_profit: float,
+                      strategy_recommendations: List[str], now_iso: str) -> Dict[str, Any]:
+        """Assess the risk of a position in one asset."""
+        if hist.empty:
+            return {"error": f"No data available for {asset}"}
+        
+        returns = hist['Close'].pct_change().dropna()
+        current_price = hist['Close'].iloc[-1]
+        
+        # Calculate risk metrics
+        return_stats = self._calculate_return_stats(returns.to_numpy(dtype=np.float64))
+        volatility = return_stats["volatility"]
+        var_95 = return_stats["var_95"]
+        var_99 = return_stats["var_99"]
+        expected_shortfall = return_stats["expected_shortfall"]
+        
+        # Position-specific risk
+        position_value = current_price * position_size
+        max_loss = position_value * stop_loss
+        potential_gain = position_value * take_profit
+        
+        # Risk-adjusted metrics
+        mean_return = return_stats["mean_return"]
+        downside_std = return_stats["downside_std"]
+        sharpe_ratio = mean_return / volatility if volatility > 0 else 0
+        sortino_ratio = mean_return / downside_std if downside_std > 0 else 0
+        
+        # Correlation with market (if multiple assets)
+        if market_returns is not None:
+            try:
+                correlation = returns.corr(market_returns)
+            except:
+                correlation = 0
+        else:
+            correlation = 0
+        
+        return {
+            "timestamp": now_iso,
+            "risk_metrics": {
+                "volatility": volatility,
+                "var_95": var_95,
+                "var_99": var_99,
+                "expected_shortfall": expected_shortfall,
+                "sharpe_ratio": sharpe_ratio,
+                "sortino_ratio": sortino_ratio,
+                "market_correlation": correlation
+            },
+            "position_risk": {
+                "position_value": position_value,
+                "max_loss": max_loss,
+                "potential_gain": potential_gain,
+                "risk_reward_ratio": potential_gain / max_loss if max_loss > 0 else 0
+            },
+            "risk_assessment": {
+                "overall_risk": self._calculate_overall_risk(volatility, var_95, correlation),
+                "risk_level": self._categorize_risk_level(volatility, var_95),
+                "recommendations": self._generate_risk_recommendations(
+                    volatility, var_95, sharpe_ratio, strategy_recommendations
+                )
+            }
+        }
+    
+    def _format_result(self, risk_metrics: Iterable[Tuple[str, Dict[str, Any]]]) -> str:
+        """Serialize the (asset, risk assessment) pairs of all assets."""
+        result = _dumps_items(risk_metrics)
+        
+        # COMPREHENSIVE LOGGING: Log the risk tool result
+        print("=" * 80)
+        print("🔧 RISK TOOL: RISK ASSESSMENT RESULT")
+        print("=" * 80)
+        print(f"Result: {result}")
+        print("=" * 80)
+        
+        return result
+    
+    def _format_error(self, e: Exception) -> str:
+        """Serialize a failed risk assessment."""
+        error_result = orjson.dumps({"error": f"Risk assessment failed: {str(e)}"}).decode()
+        print(f"❌ RISK TOOL ERROR: {str(e)}")
+        return error_result
+    
+    def _calculate_return_stats(self, returns: np.ndarray) -> Dict[str, float]:
+        """Calculate return distribution statistics from one sorted copy of the returns."""
+        ordered = np.sort(returns)
+        n = len(ordered)
+        
+        def percentile(q: float) -> float:
+            # Linear interpolation between closest ranks, as np.percentile does by default
+            pos = q / 100 * (n - 1)
+            lo = int(pos)
+            hi = min(lo + 1, n - 1)
+            return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+        
+        var_95 = percentile(5)
+        return {
+            "mean_return": returns.mean(),
+            "volatility": returns.std(ddof=1),
+            "var_95": var_95,
+            "var_99": percentile(1),
+            "expected_shortfall": ordered[:np.searchsorted(ordered, var_95, side='right')].mean(),
+            "downside_std": ordered[:np.searchsorted(ordered, 0.0, side='left')].std(ddof=1)
+        }
     
     def _calculate_overall_risk(self, volatility: float, var_95: float, correlation: float) -> float:
         """Calculate overall risk score (0-1, higher is riskier)."""
@@ -359,8 +529,8 @@ class RiskAssessmentTool(BaseTool):
             return "high"
     
     def _generate_risk_recommendations(self, volatility: float, var_95: float, 
-                                     sharpe_ratio: float, stop_loss: float, take_profit: float) -> List[str]:
-        """Generate risk management recommendations."""
+                                     sharpe_ratio: float, strategy_recommendations: List[str]) -> List[str]:
+        """Generate risk management recommendations for one asset, followed by the strategy's."""
         recommendations = []
         
         if volatility > 0.02:
@@ -372,6 +542,12 @@ class RiskAssessmentTool(BaseTool):
         if sharpe_ratio < 0.5:
             recommendations.append("Low risk-adjusted returns - reconsider strategy")
         
+        return recommendations + strategy_recommendations
+    
+    def _generate_strategy_recommendations(self, stop_loss: float, take_profit: float) -> List[str]:
+        """Generate recommendations on the strategy's exits, which are the same for every asset."""
+        recommendations = []
+        
         if stop_loss > 0.1:
             recommendations.append("Wide stop-loss - consider tighter risk management")
         
@@ -381,8 +557,66 @@ class RiskAssessmentTool(BaseTool):
         return recommendations
     
     async def _arun(self, strategy: Dict[str, Any] = None, market_conditions: Dict[str, Any] = None) -> str:
-        """Async implementation of risk assessment with flexible input handling."""
-        return self._run(strategy, market_conditions)
+        """Async implementation of risk assessment with flexible input handling, assessing assets concurrently."""
+        try:
+            assets, position_size, stop_loss, take_profit = self._prepare_inputs(strategy, market_conditions)
+            strategy_recommendations = self._generate_strategy_recommendations(stop_loss, take_profit)
+            now_iso = request_timestamp()
+            histories, market_returns = await asyncio.to_thread(self._load_histories, assets)
+            results = await asyncio.gather(*(
+                asyncio.to_thread(self._assess_asset, asset, histories[asset], market_returns,
+                                  position_size, stop_loss, take_profit, strategy_recommendations, now_iso)
+                for asset in assets
+            ))
+            return self._format_result(zip(assets, results))
+            
+        except Exception as e:
+            return self._format_error(e)
+
+# Mock execution returned by TradeExecutionTool until a trading platform is wired up
+_MOCK_EXECUTION = {
+    "status": "success",
+    "orders": [
+        {
+            "asset": "BTC",
+            "type": "buy",
+            "amount": 0.1,
+            "price": 50000,
+            "risk_score": 0.35,
+            "expected_return": 0.08
+        }
+    ],
+    "total_value": 5000,
+    "fees": 25,
+    "risk_metrics": {
+        "portfolio_var": 0.025,
+        "max_drawdown": 0.15,
+        "sharpe_ratio": 1.2
+    }
+}
+
+# TradeExecutionTool output pre-encoded once, split around the strategy,
+# risk assessment and timestamp values filled in per call
+_SLOT = "__slot__"
+_TRADE_EXECUTION_PARTS = _dumps({
+    "strategy": _SLOT,
+    "risk_assessment": _SLOT,
+    "timestamp": _SLOT,
+    "execution": _MOCK_EXECUTION
+}).split(orjson.dumps(_SLOT).decode())
+
+# Mock portfolio used by PortfolioAnalysisTool until holdings come from a database
+_MOCK_PORTFOLIO = {
+    "holdings": [
+        {"asset": "BTC", "amount": 0.5, "value": 25000, "allocation": 0.25},
+        {"asset": "ETH", "amount": 5.0, "value": 75000, "allocation": 0.75}
+    ],
+    "total_value": 100000
+}
+
+def _nested_json(value: Any) -> str:
+    """Encode a value as indented JSON for splicing one level deep into a pre-encoded object."""
+    return _dumps(value).replace("\n", "\n  ")
 
 class TradeExecutionTool(BaseTool):
     name: str = "trade_execution"
@@ -390,40 +624,17 @@ class TradeExecutionTool(BaseTool):
     
     def _run(self, strategy: Dict[str, Any], risk_assessment: Dict[str, Any]) -> str:
         """Execute trades based on strategy and risk assessment."""
-        import json  # Add import to top of function
-        
-        # This would typically connect to a trading platform API
+        # This would typically connect to a trading platform API through get_client()
         # For now, return mock execution with enhanced analysis
-        execution = {
-            "strategy": strategy,
-            "risk_assessment": risk_assessment,
-            "timestamp": datetime.utcnow().isoformat(),
-            "execution": {
-                "status": "success",
-                "orders": [
-                    {
-                        "asset": "BTC",
-                        "type": "buy",
-                        "amount": 0.1,
-                        "price": 50000,
-                        "risk_score": 0.35,
-                        "expected_return": 0.08
-                    }
-                ],
-                "total_value": 5000,
-                "fees": 25,
-                "risk_metrics": {
-                    "portfolio_var": 0.025,
-                    "max_drawdown": 0.15,
-                    "sharpe_ratio": 1.2
-                }
-            }
-        }
-        return json.dumps(execution, indent=2)
+        strategy_json = _nested_json(strategy)
+        risk_json = _nested_json(risk_assessment)
+        ts_json = orjson.dumps(request_timestamp()).decode()
+        head, after_strategy, after_risk, tail = _TRADE_EXECUTION_PARTS
+        return f"{head}{strategy_json}{after_strategy}{risk_json}{after_risk}{ts_json}{tail}"
     
     async def _arun(self, strategy: Dict[str, Any], risk_assessment: Dict[str, Any]) -> str:
         """Async implementation of trade execution."""
-        return self._run(strategy, risk_assessment)
+        return await asyncio.to_thread(self._run, strategy, risk_assessment)
 
 class PortfolioAnalysisTool(BaseTool):
     name: str = "portfolio_analysis"
@@ -431,24 +642,16 @@ class PortfolioAnalysisTool(BaseTool):
     
     def _run(self, portfolio_id: str) -> str:
         """Analyze portfolio performance with advanced metrics."""
-        import json  # Add import to top of function
-        
         try:
             # Mock portfolio data - in real implementation, this would come from a database
-            portfolio_data = {
-                "holdings": [
-                    {"asset": "BTC", "amount": 0.5, "value": 25000, "allocation": 0.25},
-                    {"asset": "ETH", "amount": 5.0, "value": 75000, "allocation": 0.75}
-                ],
-                "total_value": 100000
-            }
+            portfolio_data = _MOCK_PORTFOLIO
             
             # Calculate portfolio metrics
             returns_data = {}
+            histories = _download_history([holding["asset"] for holding in portfolio_data["holdings"]])
             for holding in portfolio_data["holdings"]:
                 asset = holding["asset"]
-                ticker = yf.Ticker(asset)
-                hist = ticker.history(period="1y")
+                hist = histories[asset]
                 
                 if not hist.empty:
                     returns = hist['Close'].pct_change().dropna()
@@ -459,38 +662,42 @@ class PortfolioAnalysisTool(BaseTool):
             
             # Portfolio-level calculations
             if returns_data:
-                # Weighted portfolio returns
-                portfolio_returns = pd.Series(0.0, index=next(iter(returns_data.values()))["returns"].index)
-                for asset, data in returns_data.items():
-                    portfolio_returns += data["returns"] * data["weight"]
+                # Weighted portfolio returns as one matrix-vector product over the dates of
+                # any holding; dates missing for some holding come out as NaN
+                returns_df = pd.DataFrame({asset: data["returns"] for asset, data in returns_data.items()})
+                weights = np.array([data["weight"] for data in returns_data.values()], dtype=np.float64)
+                returns_matrix = returns_df.to_numpy(dtype=np.float64)
+                portfolio_returns = returns_matrix @ weights
                 
-                # Portfolio metrics
-                portfolio_volatility = portfolio_returns.std()
-                portfolio_sharpe = portfolio_returns.mean() / portfolio_returns.std() if portfolio_returns.std() > 0 else 0
+                # Portfolio metrics (NaN-skipping, sample std as pandas computes them)
+                portfolio_volatility = np.nanstd(portfolio_returns, ddof=1)
+                portfolio_sharpe = np.nanmean(portfolio_returns) / portfolio_volatility if portfolio_volatility > 0 else 0
                 portfolio_var = np.percentile(portfolio_returns, 5)
-                portfolio_max_dd = self._calculate_max_drawdown(portfolio_returns.cumsum())
+                portfolio_max_dd = self._calculate_max_drawdown(np.nancumsum(portfolio_returns))
                 
                 # Diversification analysis
                 if len(returns_data) > 1:
-                    returns_df = pd.DataFrame({asset: data["returns"] for asset, data in returns_data.items()})
-                    correlation_matrix = returns_df.corr()
-                    avg_correlation = (correlation_matrix.sum().sum() - len(correlation_matrix)) / (len(correlation_matrix) ** 2 - len(correlation_matrix))
+                    # Mean off-diagonal correlation over the dates every holding has returns for
+                    complete = returns_matrix[~np.isnan(returns_matrix).any(axis=1)]
+                    correlation_matrix = np.corrcoef(complete, rowvar=False)
+                    n = correlation_matrix.shape[0]
+                    avg_correlation = (correlation_matrix.sum() - n) / (n * (n - 1))
                 else:
                     avg_correlation = 1.0
                 
                 analysis = {
                     "portfolio_id": portfolio_id,
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": request_timestamp(),
                     "performance": {
                         "total_value": portfolio_data["total_value"],
-                        "daily_change": float(portfolio_returns.iloc[-1]) if len(portfolio_returns) > 0 else 0,
-                        "monthly_change": float(portfolio_returns.tail(30).sum()) if len(portfolio_returns) >= 30 else 0,
-                        "yearly_change": float(portfolio_returns.sum()) if len(portfolio_returns) > 0 else 0,
-                        "volatility": float(portfolio_volatility),
-                        "sharpe_ratio": float(portfolio_sharpe),
-                        "var_95": float(portfolio_var),
-                        "max_drawdown": float(portfolio_max_dd),
-                        "avg_correlation": float(avg_correlation)
+                        "daily_change": portfolio_returns[-1] if len(portfolio_returns) > 0 else 0,
+                        "monthly_change": np.nansum(portfolio_returns[-30:]) if len(portfolio_returns) >= 30 else 0,
+                        "yearly_change": np.nansum(portfolio_returns) if len(portfolio_returns) > 0 else 0,
+                        "volatility": portfolio_volatility,
+                        "sharpe_ratio": portfolio_sharpe,
+                        "var_95": portfolio_var,
+                        "max_drawdown": portfolio_max_dd,
+                        "avg_correlation": avg_correlation
                     },
                     "holdings": portfolio_data["holdings"],
                     "diversification_score": self._calculate_diversification_score(avg_correlation, len(returns_data)),
@@ -501,20 +708,21 @@ class PortfolioAnalysisTool(BaseTool):
             else:
                 analysis = {
                     "portfolio_id": portfolio_id,
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": request_timestamp(),
                     "error": "Unable to calculate portfolio metrics - insufficient data"
                 }
             
-            return json.dumps(analysis, indent=2)
+            return _dumps(analysis)
             
         except Exception as e:
-            return json.dumps({"error": f"Portfolio analysis failed: {str(e)}"})
+            return orjson.dumps({"error": f"Portfolio analysis failed: {str(e)}"}).decode()
     
-    def _calculate_max_drawdown(self, cumulative_returns: pd.Series) -> float:
+    def _calculate_max_drawdown(self, cumulative_returns: np.ndarray) -> float:
         """Calculate maximum drawdown from cumulative returns."""
-        peak = cumulative_returns.expanding().max()
+        cumulative_returns = np.asarray(cumulative_returns, dtype=np.float64)
+        peak = np.fmax.accumulate(cumulative_returns)
         drawdown = (cumulative_returns - peak) / peak
-        return float(drawdown.min())
+        return float(np.nanmin(drawdown))
     
     def _calculate_diversification_score(self, avg_correlation: float, num_assets: int) -> float:
         """Calculate diversification score (0-1, higher is better diversified)."""
@@ -544,4 +752,11 @@ class PortfolioAnalysisTool(BaseTool):
     
     async def _arun(self, portfolio_id: str) -> str:
         """Async implementation of portfolio analysis."""
-        return self._run(portfolio_id) 
\ No newline at end of file
+        return await asyncio.to_thread(self._run, portfolio_id) 
+
+# Shared tool instances. The tools are stateless, so agents reuse these
+# rather than constructing their own copies.
+MARKET_TOOL = MarketAnalysisTool()
+RISK_TOOL = RiskAssessmentTool()
+TRADE_TOOL = TradeExecutionTool()
+PORTFOLIO_TOOL = PortfolioAnalysisTool()
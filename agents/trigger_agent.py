@@ -18,8 +18,9 @@ class TriggerAgent(BaseAgent):
                 'message': 'Missing ask_id, sender_did, token, or public_key'
             }
         # Verify sender for this ask/session
-        if not self.is_verified(ask_id, sender_did):
-            if not self.verify_agent(ask_id, sender_did, sender_token, sender_public_key, algorithm='RS256'):
+        if not await self.is_verified(ask_id, sender_did):
+            verification_result = await self.verify_agent(ask_id, sender_did, sender_token, sender_public_key, algorithm='RS256')
+            if not verification_result.get("verified", False):
                 return {
                     'status': 'error',
                     'message': 'DID/JWT verification failed'
@@ -35,7 +36,7 @@ class TriggerAgent(BaseAgent):
             }
             token = self.create_token(trading_request, algorithm='RS256')
             # End session after ask is complete
-            self.end_ask(ask_id)
+            await self.end_ask(ask_id)
             return {
                 'status': 'success',
                 'message': 'Trading request created',
@@ -1,14 +1,20 @@
 from fastapi import FastAPI, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, Set
 import asyncio
-import json
+import logging
+import orjson
 from datetime import datetime
 
 from agents.ai_trading_agents import AITriggerAgent, AIExpertTraderAgent, AIRiskEvaluatorAgent
 from main import AITradingSystem
 
+logger = logging.getLogger(__name__)
+
+# Messages buffered per client before a client that can't keep up is dropped
+BROADCAST_QUEUE_SIZE = 256
+
 app = FastAPI(title="AI Trading System API")
 
 # Enable CORS
@@ -27,20 +33,72 @@ class TradingRequest(BaseModel):
     goals: Dict[str, Any]
     constraints: Dict[str, Any]
 
+def _pack(type_: str, agent: str, key: str, data: Any, ts: str) -> str:
+    """Serialize a message for the WebSocket clients."""
+    return orjson.dumps({"type": type_, "agent": agent, key: data, "timestamp": ts}).decode()
+
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # Each client gets its own outgoing queue, drained by a dedicated writer task
+        self.active_connections: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        self._closing: Set[asyncio.Task] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections[websocket] = asyncio.Queue(maxsize=BROADCAST_QUEUE_SIZE)
+        self._writers[websocket] = asyncio.create_task(self._writer_loop(websocket))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        # A failed send or a full queue may already have dropped the connection
+        self.active_connections.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    def _drop(self, websocket: WebSocket):
+        """Disconnect a client that can't be sent to and close its socket, ending its endpoint loop."""
+        self.disconnect(websocket)
+        task = asyncio.create_task(self._close(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            # The socket is usually already broken when a send has failed
+            pass
+
+    async def _writer_loop(self, websocket: WebSocket):
+        queue = self.active_connections[websocket]
+        while True:
+            message = await queue.get()
+            try:
+                await websocket.send_text(message)
+            except Exception as e:
+                logger.warning("Dropping WebSocket client after failed send: %s", e)
+                self._drop(websocket)
+                return
+
+    def _enqueue(self, websocket: WebSocket, queue: asyncio.Queue, message: str):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client is too slow to keep up
+            logger.warning("Dropping WebSocket client with %d unsent messages", queue.qsize())
+            self._drop(websocket)
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        # Goes through the client's queue so it never interleaves with the writer's sends
+        queue = self.active_connections.get(websocket)
+        if queue is not None:
+            self._enqueue(websocket, queue, message)
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+        # Queue the message for every client without waiting on any of them
+        for websocket, queue in list(self.active_connections.items()):
+            self._enqueue(websocket, queue, message)
 
 manager = WebSocketManager()
 
@@ -49,6 +107,11 @@ async def startup_event():
     global trading_system
     trading_system = AITradingSystem()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if trading_system is not None:
+        await trading_system.close()
+
 @app.get("/")
 async def root():
     return {"message": "AI Trading System API"}
@@ -71,41 +134,28 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             data = await websocket.receive_text()
             try:
-                request_data = json.loads(data)
+                request_data = orjson.loads(data)
                 request = TradingRequest(**request_data)
                 
                 # Process request and send updates
                 async def process_and_broadcast():
                     try:
                         # Trigger Agent Analysis
-                        await manager.broadcast(json.dumps({
-                            "type": "status",
-                            "agent": "trigger",
-                            "message": "Analyzing market conditions...",
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        ts = datetime.utcnow().isoformat()
+                        await manager.broadcast(_pack("status", "trigger", "message", "Analyzing market conditions...", ts))
                         
                         trigger_response = await trading_system.trigger_agent.process_message({
                             "type": "trading_request",
                             "goals": request.goals,
                             "constraints": request.constraints,
-                            "timestamp": datetime.utcnow().isoformat()
+                            "timestamp": ts
                         })
                         
-                        await manager.broadcast(json.dumps({
-                            "type": "analysis",
-                            "agent": "trigger",
-                            "data": trigger_response,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        await manager.broadcast(_pack("analysis", "trigger", "data", trigger_response, datetime.utcnow().isoformat()))
                         
                         # Expert Trader Strategy
-                        await manager.broadcast(json.dumps({
-                            "type": "status",
-                            "agent": "expert",
-                            "message": "Developing trading strategy...",
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        ts = datetime.utcnow().isoformat()
+                        await manager.broadcast(_pack("status", "expert", "message", "Developing trading strategy...", ts))
                         
                         expert_response = await trading_system.expert_trader.process_message({
                             "type": "strategy_development",
@@ -114,40 +164,20 @@ async def websocket_endpoint(websocket: WebSocket):
                             "constraints": request.constraints
                         })
                         
-                        await manager.broadcast(json.dumps({
-                            "type": "strategy",
-                            "agent": "expert",
-                            "data": expert_response,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        await manager.broadcast(_pack("strategy", "expert", "data", expert_response, datetime.utcnow().isoformat()))
                         
                         # Risk Evaluation
-                        await manager.broadcast(json.dumps({
-                            "type": "status",
-                            "agent": "risk",
-                            "message": "Evaluating risks...",
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        await manager.broadcast(_pack("status", "risk", "message", "Evaluating risks...", datetime.utcnow().isoformat()))
                         
                         risk_response = await trading_system.risk_evaluator.evaluate_strategy(
                             strategy=expert_response["response"],
                             market_conditions=trigger_response["response"]
                         )
                         
-                        await manager.broadcast(json.dumps({
-                            "type": "risk",
-                            "agent": "risk",
-                            "data": risk_response,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        await manager.broadcast(_pack("risk", "risk", "data", risk_response, datetime.utcnow().isoformat()))
                         
                         # Final Decision
-                        await manager.broadcast(json.dumps({
-                            "type": "status",
-                            "agent": "expert",
-                            "message": "Making final decision...",
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        await manager.broadcast(_pack("status", "expert", "message", "Making final decision...", datetime.utcnow().isoformat()))
                         
                         final_decision = await trading_system.expert_trader.process_message({
                             "type": "execution_decision",
@@ -155,35 +185,30 @@ async def websocket_endpoint(websocket: WebSocket):
                             "risk_evaluation": risk_response["response"]
                         })
                         
-                        await manager.broadcast(json.dumps({
-                            "type": "decision",
-                            "agent": "expert",
-                            "data": final_decision,
-                            "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        await manager.broadcast(_pack("decision", "expert", "data", final_decision, datetime.utcnow().isoformat()))
                         
                     except Exception as e:
-                        await manager.broadcast(json.dumps({
+                        await manager.broadcast(orjson.dumps({
                             "type": "error",
                             "message": str(e),
                             "timestamp": datetime.utcnow().isoformat()
-                        }))
+                        }).decode())
                 
                 # Start processing in background
                 asyncio.create_task(process_and_broadcast())
                 
-            except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+            except orjson.JSONDecodeError:
+                await manager.send_personal_message(orjson.dumps({
                     "type": "error",
                     "message": "Invalid JSON format",
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                }).decode(), websocket)
             except Exception as e:
-                await websocket.send_text(json.dumps({
+                await manager.send_personal_message(orjson.dumps({
                     "type": "error",
                     "message": str(e),
                     "timestamp": datetime.utcnow().isoformat()
-                }))
+                }).decode(), websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
@@ -191,4 +216,6 @@ async def websocket_endpoint(websocket: WebSocket):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # Broadcasts send the same message to every client; per-message deflate
+    # would compress it again for each connection
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=False) 
\ No newline at end of file
@@ -2,11 +2,16 @@
 Enhanced Agent Orchestrator module for coordinating trading agents with blockchain-based DID verification.
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
 from datetime import datetime
+import copy
+import hashlib
 import os
 import logging
 import json
+import time
+import orjson
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 import uuid
@@ -20,6 +25,16 @@ from agents.risk_agent import RiskAgent
 
 load_dotenv()
 
+# Seconds the agents' analysis of a request is reused for identical requests
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 600))
+RESPONSE_CACHE_SIZE = 1024
+
+def _response_cache_key(goals: Dict[str, Any], constraints: Dict[str, Any],
+                        expert_did: str, risk_did: Optional[str]) -> str:
+    """Digest of everything that determines the agents' analysis of a request."""
+    payload = json.dumps({"g": goals, "c": constraints, "e": expert_did, "r": risk_did}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
 class OrchestratorState(BaseModel):
     """State management for the orchestrator."""
     session_id: str
@@ -67,6 +82,9 @@ class TradingAgentOrchestrator:
         # Active sessions
         self.sessions: Dict[str, OrchestratorState] = {}
         
+        # Agent results by request digest: {key: (expires_at, (expert_analysis, risk_evaluation))}, LRU ordered
+        self._response_cache: "OrderedDict[str, Tuple[float, Tuple[Dict[str, Any], Dict[str, Any]]]]" = OrderedDict()
+        
         # Pre-initialize known agents
         self._initialize_known_agents()
         
@@ -185,6 +203,31 @@ class TradingAgentOrchestrator:
             self.logger.error(f"Failed to initialize agent {did}: {str(e)}")
             raise
 
+    def _debug_dump(self, label: str, obj: Any) -> None:
+        """Log a pretty-printed payload at DEBUG, serializing only when DEBUG is enabled"""
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("[Orchestrator] %s:\n%s", label, orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str).decode())
+
+    def _get_cached_response(self, key: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Get the agents' results for an identical recent request, dropping them once expired."""
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at <= time.monotonic():
+            del self._response_cache[key]
+            return None
+        self._response_cache.move_to_end(key)
+        # Copy so sessions never share, or modify, the cached dicts
+        return copy.deepcopy(results)
+
+    def _store_cached_response(self, key: str, results: Tuple[Dict[str, Any], Dict[str, Any]]) -> None:
+        """Store the agents' results for a request, evicting the oldest when full."""
+        self._response_cache[key] = (time.monotonic() + RESPONSE_CACHE_TTL, copy.deepcopy(results))
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+
     async def create_token(self, recipient_did: str, message_type: str, payload: Dict[str, Any]) -> str:
         """Create a JWT token for agent communication."""
         try:
@@ -233,23 +276,12 @@ class TradingAgentOrchestrator:
             human_trader_did = verification.get('did')
             human_token = verification.get('jwt')
             
-            # COMPREHENSIVE LOGGING: Log the orchestrator processing
-            print("=" * 80)
-            print("🎯 ORCHESTRATOR: PROCESSING TRADING REQUEST")
-            print("=" * 80)
-            print(f"Session ID: {session_id}")
-            print(f"Human Trader DID: {human_trader_did}")
-            print(f"Request: {json.dumps(request, indent=2)}")
-            
             # Extract and log user assets
             goals = request.get("goals", {})
             constraints = request.get("constraints", {})
-            user_assets = goals.get("assets", [])
-            allowed_assets = constraints.get("allowed_assets", [])
-            
-            print(f"User Assets from Goals: {user_assets}")
-            print(f"Allowed Assets from Constraints: {allowed_assets}")
-            print("=" * 80)
+            self.logger.info("[Orchestrator] Processing trading request %s from %s: assets=%s, allowed_assets=%s",
+                             session_id, human_trader_did, goals.get("assets", []), constraints.get("allowed_assets", []))
+            self._debug_dump("Request", request)
             
             if not human_trader_did or not human_token:
                 return {"status": "error", "message": "Missing trader DID or token"}
@@ -271,132 +303,122 @@ class TradingAgentOrchestrator:
             if not expert_did:
                 return {"status": "error", "message": "Expert agent DID not specified"}
             
-            self.initialize_agent(expert_did, "expert")
-            
-            # Create token for expert agent
-            expert_token = await self.create_token(
-                recipient_did=expert_did,
-                message_type="trading_request",
-                payload={
+            # Reuse the agents' analysis of an identical recent request
+            cache_key = _response_cache_key(goals, constraints, expert_did, request.get("risk_agent_did"))
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                # Don't serve analysis from agents that have since been deactivated
+                for did in (expert_did, request.get("risk_agent_did")):
+                    if not self.get_agent_info(did).get("is_active", True):
+                        raise ValueError(f"Agent {did} is not active")
+                self.logger.info("Reusing cached agent analysis for session %s", session_id)
+                expert_analysis, risk_evaluation = cached
+            else:
+                self.initialize_agent(expert_did, "expert")
+                
+                # Create token for expert agent
+                expert_token = await self.create_token(
+                    recipient_did=expert_did,
+                    message_type="trading_request",
+                    payload={
+                        "goals": request.get("goals", {}),
+                        "constraints": request.get("constraints", {}),
+                        "timestamp": datetime.now().isoformat(),
+                        "ask_id": session_id
+                    }
+                )
+                
+                expert_request = {
+                    "type": "trading_request",
                     "goals": request.get("goals", {}),
                     "constraints": request.get("constraints", {}),
                     "timestamp": datetime.now().isoformat(),
-                    "ask_id": session_id
+                    "ask_id": session_id,
+                    "sender_did": self.admin_did,
+                    "token": expert_token,
+                    "public_key": self.admin_did
                 }
-            )
-            
-            # COMPREHENSIVE LOGGING: Log expert agent request
-            print("=" * 80)
-            print("🧠 ORCHESTRATOR: SENDING TO EXPERT AGENT")
-            print("=" * 80)
-            expert_request = {
-                "type": "trading_request",
-                "goals": request.get("goals", {}),
-                "constraints": request.get("constraints", {}),
-                "timestamp": datetime.now().isoformat(),
-                "ask_id": session_id,
-                "sender_did": self.admin_did,
-                "token": expert_token,
-                "public_key": self.admin_did
-            }
-            print(f"Expert Request: {json.dumps(expert_request, indent=2)}")
-            print("=" * 80)
-            
-            # Process with expert agent
-            expert_response = await self.agents[expert_did].process_message(expert_request)
-            
-            # COMPREHENSIVE LOGGING: Log expert agent response
-            print("=" * 80)
-            print("🧠 ORCHESTRATOR: EXPERT AGENT RESPONSE")
-            print("=" * 80)
-            print(f"Status: {expert_response.get('status')}")
-            print(f"Message: {expert_response.get('message', 'No message')}")
-            print(f"Analysis: {json.dumps(expert_response.get('analysis', {}), indent=2)}")
-            print("=" * 80)
-            
-            if expert_response.get("status") != "success":
-                return {"status": "error", "message": expert_response.get("message")}
-            
-            # Get or initialize risk agent
-            risk_did = request.get("risk_agent_did")
-            if not risk_did:
-                return {"status": "error", "message": "Risk agent DID not specified"}
-            
-            self.initialize_agent(risk_did, "risk")
-            
-            # Create token for risk agent
-            risk_token = await self.create_token(
-                recipient_did=risk_did,
-                message_type="risk_evaluation_request",
-                payload={
+                self._debug_dump("Expert request", expert_request)
+                
+                # Process with expert agent
+                expert_response = await self.agents[expert_did].process_message(expert_request)
+                
+                self.logger.info("[Orchestrator] Expert agent response: status=%s, message=%s",
+                                 expert_response.get('status'), expert_response.get('message', 'No message'))
+                self._debug_dump("Expert analysis", expert_response.get('analysis', {}))
+                
+                if expert_response.get("status") != "success":
+                    return {"status": "error", "message": expert_response.get("message")}
+                
+                # Get or initialize risk agent
+                risk_did = request.get("risk_agent_did")
+                if not risk_did:
+                    return {"status": "error", "message": "Risk agent DID not specified"}
+                
+                self.initialize_agent(risk_did, "risk")
+                
+                # Create token for risk agent
+                risk_token = await self.create_token(
+                    recipient_did=risk_did,
+                    message_type="risk_evaluation_request",
+                    payload={
+                        "trading_analysis": expert_response.get("analysis", {}),
+                        "market_conditions": expert_response.get("analysis", {}),  # Use analysis as market_conditions for now
+                        "timestamp": datetime.now().isoformat(),
+                        "ask_id": session_id
+                    }
+                )
+                
+                risk_request = {
+                    "type": "risk_evaluation_request",
                     "trading_analysis": expert_response.get("analysis", {}),
-                    "market_conditions": expert_response.get("analysis", {}),  # Use analysis as market_conditions for now
+                    "market_conditions": expert_response.get("analysis", {}),
                     "timestamp": datetime.now().isoformat(),
-                    "ask_id": session_id
+                    "ask_id": session_id,
+                    "sender_did": self.admin_did,
+                    "token": risk_token,
+                    "public_key": self.admin_did
                 }
-            )
-            
-            # COMPREHENSIVE LOGGING: Log risk agent request
-            print("=" * 80)
-            print("⚠️ ORCHESTRATOR: SENDING TO RISK AGENT")
-            print("=" * 80)
-            risk_request = {
-                "type": "risk_evaluation_request",
-                "trading_analysis": expert_response.get("analysis", {}),
-                "market_conditions": expert_response.get("analysis", {}),
-                "timestamp": datetime.now().isoformat(),
-                "ask_id": session_id,
-                "sender_did": self.admin_did,
-                "token": risk_token,
-                "public_key": self.admin_did
-            }
-            print(f"Risk Request: {json.dumps(risk_request, indent=2)}")
-            print("=" * 80)
-            
-            # Process with risk agent
-            risk_response = await self.agents[risk_did].process_message(risk_request)
-            
-            # COMPREHENSIVE LOGGING: Log risk agent response
-            print("=" * 80)
-            print("⚠️ ORCHESTRATOR: RISK AGENT RESPONSE")
-            print("=" * 80)
-            print(f"Status: {risk_response.get('status')}")
-            print(f"Message: {risk_response.get('message', 'No message')}")
-            print(f"Evaluation: {json.dumps(risk_response.get('evaluation', {}), indent=2)}")
-            print("=" * 80)
-            
-            # Check if risk response has evaluation data, even if status is not success
-            risk_evaluation = {}
-            if risk_response.get("status") == "success":
-                risk_evaluation = risk_response.get("evaluation", {})
-            elif risk_response.get("evaluation"):
-                # If we have evaluation data even with error status, use it
-                risk_evaluation = risk_response.get("evaluation", {})
-                self.logger.warning(f"Risk agent returned error status but provided evaluation data: {risk_response.get('message', 'Unknown error')}")
-            else:
-                # Only return error if we have no evaluation data at all
-                return {"status": "error", "message": risk_response.get("message", "Risk evaluation failed")}
+                self._debug_dump("Risk request", risk_request)
+                
+                # Process with risk agent
+                risk_response = await self.agents[risk_did].process_message(risk_request)
+                
+                self.logger.info("[Orchestrator] Risk agent response: status=%s, message=%s",
+                                 risk_response.get('status'), risk_response.get('message', 'No message'))
+                self._debug_dump("Risk evaluation", risk_response.get('evaluation', {}))
+                
+                # Check if risk response has evaluation data, even if status is not success
+                risk_evaluation = {}
+                if risk_response.get("status") == "success":
+                    risk_evaluation = risk_response.get("evaluation", {})
+                elif risk_response.get("evaluation"):
+                    # If we have evaluation data even with error status, use it
+                    risk_evaluation = risk_response.get("evaluation", {})
+                    self.logger.warning(f"Risk agent returned error status but provided evaluation data: {risk_response.get('message', 'Unknown error')}")
+                else:
+                    # Only return error if we have no evaluation data at all
+                    return {"status": "error", "message": risk_response.get("message", "Risk evaluation failed")}
+                
+                expert_analysis = expert_response.get("analysis", {})
+                if risk_response.get("status") == "success":
+                    self._store_cached_response(cache_key, (expert_analysis, risk_evaluation))
             
             # Update session state
             self.sessions[session_id].analysis_results = {
-                "expert_analysis": expert_response.get("analysis", {}),
+                "expert_analysis": expert_analysis,
                 "risk_evaluation": risk_evaluation,
                 "timestamp": datetime.now().isoformat()
             }
             self.sessions[session_id].status = "completed"
             
-            # COMPREHENSIVE LOGGING: Log final result
-            print("=" * 80)
-            print("✅ ORCHESTRATOR: FINAL RESULT")
-            print("=" * 80)
             final_result = {
                 "status": "success",
                 "session_id": session_id,
                 "result": self.sessions[session_id].analysis_results,
                 "timestamp": datetime.now().isoformat()
             }
-            print(f"Final Result: {json.dumps(final_result, indent=2)}")
-            print("=" * 80)
+            self._debug_dump("Final result", final_result)
             
             return final_result
             
@@ -414,6 +436,11 @@ class TradingAgentOrchestrator:
                 "timestamp": datetime.now().isoformat()
             }
 
+    async def close(self) -> None:
+        """Release connections held by the initialized agents."""
+        for agent in self.agents.values():
+            await agent.close()
+
     async def get_session_status(self, session_id: str) -> Dict[str, Any]:
         """Get the status of a trading session."""
         if session_id not in self.sessions:
@@ -433,4 +460,11 @@ def get_orchestrator() -> TradingAgentOrchestrator:
     global _orchestrator
     if _orchestrator is None:
         _orchestrator = TradingAgentOrchestrator()
-    return _orchestrator 
\ No newline at end of file
+    return _orchestrator
+
+async def close_orchestrator() -> None:
+    """Shut down the global orchestrator instance if it was created."""
+    global _orchestrator
+    if _orchestrator is not None:
+        await _orchestrator.close()
+        _orchestrator = None 
\ No newline at end of file
@@ -16,7 +16,7 @@ from typing import Dict, Any, Optional
 # from main import AITradingSystem
 from backend.eth_jwt_utils import verify_jwt_with_ethereum_key
 from backend.llm_agent_handlers import get_agent_handler
-from backend.agent_orchestrator import get_orchestrator
+from backend.agent_orchestrator import get_orchestrator, close_orchestrator
 from backend.did_registry import did_registry
 import logging
 from dotenv import load_dotenv
@@ -84,6 +84,11 @@ class AgentRegistrationRequest(BaseModel):
     public_key: str
     metadata: dict = {}
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release agent connections on shutdown"""
+    await close_orchestrator()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -54,8 +54,8 @@ class DIDRegistry:
     
     # DID validation patterns
     DID_PATTERNS = {
-        DIDMethod.ETH: r'^did:eth:0x[a-fA-F0-9]{40}$',
-        DIDMethod.ETHR: r'^did:ethr:0x[a-fA-F0-9]{40}$'
+        DIDMethod.ETH: re.compile(r'^did:eth:0x[a-fA-F0-9]{40}$'),
+        DIDMethod.ETHR: re.compile(r'^did:ethr:0x[a-fA-F0-9]{40}$')
     }
     
     def __init__(self):
@@ -119,13 +119,15 @@ class DIDRegistry:
     def validate_did(self, did: str) -> Tuple[bool, Optional[DIDMethod]]:
         """Validate DID format and return the method if valid"""
         for method, pattern in self.DID_PATTERNS.items():
-            if re.match(pattern, did):
+            if pattern.match(did):
                 return True, method
         return False, None
     
     def normalize_did(self, did: str) -> str:
         """Normalize DID to did:eth: format"""
-        return did.replace("did:ethr:", "did:eth:")
+        if did.startswith("did:ethr:"):
+            return "did:eth:" + did[len("did:ethr:"):]
+        return did
     
     def register(self, did: str, public_key: str) -> bool:
         """Register a new DID with its public key"""
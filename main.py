@@ -3,6 +3,8 @@ import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
 from agents.ai_trading_agents import AITriggerAgent, AIExpertTraderAgent, AIRiskEvaluatorAgent
+from agents.ai_base_agent import close_http_client
+from agents.trading_tools import close_client
 from fastapi import FastAPI
 
 load_dotenv()
@@ -66,6 +68,16 @@ class AITradingSystem:
                 "timestamp": datetime.utcnow().isoformat()
             }
 
+    async def close(self) -> None:
+        """Flush agent memory and release resources."""
+        await asyncio.gather(
+            self.trigger_agent.close(),
+            self.expert_trader.close(),
+            self.risk_evaluator.close()
+        )
+        await close_client()
+        await close_http_client()
+
 async def main():
     # Example usage
     trading_system = AITradingSystem()
@@ -97,6 +109,8 @@ async def main():
         print("Timestamp:", result["timestamp"])
     except Exception as e:
         print(f"Error processing trading request: {e}")
+    finally:
+        await trading_system.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
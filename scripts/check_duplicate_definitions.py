@@ -0,0 +1,43 @@
+"""
+Script to detect duplicate top-level class and function definitions
+"""
+
+import ast
+import logging
+import sys
+from pathlib import Path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGES = ["agents", "backend", "api"]
+
+def find_duplicates(path: Path):
+    """Return (name, line) pairs for top-level definitions that shadow an earlier one"""
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    seen = set()
+    duplicates = []
+    for node in tree.body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            if node.name in seen:
+                duplicates.append((node.name, node.lineno))
+            seen.add(node.name)
+    return duplicates
+
+def main() -> int:
+    """Check all package modules and exit non-zero if any duplicates are found"""
+    found = False
+    for package in PACKAGES:
+        for path in sorted((ROOT / package).rglob("*.py")):
+            for name, lineno in find_duplicates(path):
+                logger.error(f"{path.relative_to(ROOT)}:{lineno}: duplicate definition of '{name}'")
+                found = True
+    
+    if not found:
+        logger.info("No duplicate top-level definitions found")
+    return 1 if found else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
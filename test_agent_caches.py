@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for the agents' token and public key caches
+"""
+
+import asyncio
+import time
+import jwt
+from agents import base_agent
+from agents.base_agent import BaseAgent, TOKEN_EXPIRY_LEEWAY
+
+SECRET = "test-secret-key-that-is-long-enough-for-hs256"
+
+class _TestAgent(BaseAgent):
+    """Minimal concrete agent counting how often a token signature is checked."""
+    
+    def __init__(self):
+        super().__init__(did="did:eth:0x1234567890123456789012345678901234567890", name="TestAgent")
+        self.signature_checks = 0
+    
+    def _verify_token_signature(self, token, public_key, algorithm):
+        self.signature_checks += 1
+        return super()._verify_token_signature(token, public_key, algorithm)
+    
+    async def process_message(self, message):
+        return {}
+
+def test_verify_token_cache_expiry():
+    """verify_token reuses verified claims until the token is about to expire"""
+    agent = _TestAgent()
+    agent.redis_client = None
+    exp = time.time() + TOKEN_EXPIRY_LEEWAY + 1
+    token = jwt.encode({"sub": agent.did, "exp": exp}, SECRET, algorithm="HS256")
+    
+    async def run():
+        first = await agent.verify_token(token, SECRET, algorithm="HS256")
+        second = await agent.verify_token(token, SECRET, algorithm="HS256")
+        assert first == second
+        assert agent.signature_checks == 1, "Repeat token was verified again"
+        
+        # Past exp - leeway the cached claims must not be reused
+        await asyncio.sleep(exp - TOKEN_EXPIRY_LEEWAY - time.time() + 0.1)
+        await agent.verify_token(token, SECRET, algorithm="HS256")
+        assert agent.signature_checks == 2, "Claims near expiry were served from the cache"
+    
+    asyncio.run(run())
+    print("✅ verify_token cache expires with the token")
+
+def test_session_claims_expire_with_token():
+    """Claims stored with a session are not reused once the token has expired"""
+    agent = _TestAgent()
+    agent.redis_client = None
+    exp = time.time() + TOKEN_EXPIRY_LEEWAY + 1
+    token = jwt.encode({"sub": agent.did, "exp": exp}, SECRET, algorithm="HS256")
+    
+    async def run():
+        result = await agent.verify_agent("ask-1", agent.did, token, SECRET, algorithm="HS256")
+        assert result["verified"], result
+        assert await agent.get_verified_claims("ask-1", agent.did, token) is not None
+        
+        # The session stays live for SESSION_TTL, long after the token expires
+        await asyncio.sleep(exp - TOKEN_EXPIRY_LEEWAY - time.time() + 0.1)
+        assert await agent.is_verified("ask-1", agent.did)
+        assert await agent.get_verified_claims("ask-1", agent.did, token) is None, "Expired token's claims were reused"
+    
+    asyncio.run(run())
+    print("✅ Session claims are not reused after the token expires")
+
+def test_public_key_cache_expiry():
+    """Registry public keys are reused within the TTL and looked up again after it"""
+    registry = {"did:eth:0xabc": "key-1"}
+    original = base_agent.did_registry
+    base_agent.did_registry = type("Registry", (), {"get": staticmethod(registry.get)})()
+    base_agent._PUBLIC_KEY_CACHE.clear()
+    try:
+        assert base_agent._lookup_public_key("did:eth:0xabc") == "key-1"
+        registry["did:eth:0xabc"] = "key-2"
+        assert base_agent._lookup_public_key("did:eth:0xabc") == "key-1", "Key was not cached"
+        
+        # Expire the entry instead of waiting out the TTL
+        base_agent._PUBLIC_KEY_CACHE["did:eth:0xabc"] = (time.monotonic() - 1, "key-1")
+        assert base_agent._lookup_public_key("did:eth:0xabc") == "key-2", "Rotated key was not picked up"
+        assert base_agent._lookup_public_key("did:eth:0xmissing") is None
+        assert "did:eth:0xmissing" not in base_agent._PUBLIC_KEY_CACHE, "Miss was cached"
+    finally:
+        base_agent.did_registry = original
+        base_agent._PUBLIC_KEY_CACHE.clear()
+    print("✅ Public key cache picks up rotated keys after the TTL")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Agent Cache Test Suite")
+    print("=" * 50)
+    
+    tests = [test_verify_token_cache_expiry, test_session_claims_expire_with_token, test_public_key_cache_expiry]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    
+    print("\n" + "=" * 50)
+    print(f"  Tests Passed: {passed}/{len(tests)}")
+
+if __name__ == "__main__":
+    main()
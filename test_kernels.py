@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test script checking the compiled numeric kernels against their pandas formulations
+"""
+
+import numpy as np
+import pandas as pd
+from agents.kernels import rsi_macd
+
+def _pandas_rsi_macd(prices, period=14, fast=12, slow=26, signal=9):
+    """RSI, MACD and signal line as the trading tools computed them with pandas."""
+    delta = prices.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
+    rsi = 100 - (100 / (1 + gain / loss))
+    macd = prices.ewm(span=fast).mean() - prices.ewm(span=slow).mean()
+    return rsi, macd, macd.ewm(span=signal).mean()
+
+def test_rsi_macd_matches_pandas():
+    """rsi_macd matches the pandas RSI and MACD on random walks and flat stretches"""
+    rng = np.random.default_rng(42)
+    series = {
+        "random walk": 100 + np.cumsum(rng.normal(0, 1, 300)),
+        "rising only": np.linspace(50, 80, 60),
+        "flat then moving": np.concatenate([np.full(20, 10.0), 10 + np.cumsum(rng.normal(0, 0.5, 40))]),
+        "shorter than period": 100 + np.cumsum(rng.normal(0, 1, 10)),
+    }
+    for label, close in series.items():
+        rsi, macd, macd_signal = rsi_macd(close, 14, 12, 26, 9)
+        expected = _pandas_rsi_macd(pd.Series(close))
+        for name, actual, reference in zip(("rsi", "macd", "signal"), (rsi, macd, macd_signal), expected):
+            np.testing.assert_allclose(actual, reference.to_numpy(), rtol=1e-9, atol=1e-9,
+                                       err_msg=f"{name} differs for {label}")
+    print("✅ rsi_macd matches the pandas RSI and MACD")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Kernel Test Suite")
+    print("=" * 50)
+    
+    tests = [test_rsi_macd_matches_pandas]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    
+    print("\n" + "=" * 50)
+    print(f"  Tests Passed: {passed}/{len(tests)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test script for the trading tools' shared price history cache
+"""
+
+import threading
+import time
+import pandas as pd
+from agents import trading_tools
+
+def _fake_download(calls, active, peak):
+    """Stand-in for yf.download that records each call and how many overlap."""
+    lock = threading.Lock()
+    
+    def download(tickers, period, **kwargs):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            calls.append(list(tickers))
+        time.sleep(0.1)
+        index = pd.date_range("2024-01-01", periods=3)
+        # Tag each ticker's prices so a frame handed to the wrong ticker is detected
+        frames = {ticker: pd.DataFrame({"Close": [float(ord(ticker[0]))] * 3}, index=index) for ticker in tickers}
+        with lock:
+            active[0] -= 1
+        return pd.concat(frames, axis=1)
+    
+    return download
+
+def test_overlapping_downloads():
+    """Overlapping _download_history calls download serially and share the cache"""
+    calls, active, peak = [], [0], [0]
+    original = trading_tools.yf.download
+    trading_tools.yf.download = _fake_download(calls, active, peak)
+    trading_tools._HISTORY_CACHE.clear()
+    results = {}
+    
+    def fetch(assets):
+        results[tuple(assets)] = trading_tools._download_history(assets, "1mo")
+    
+    try:
+        threads = [threading.Thread(target=fetch, args=(assets,)) for assets in (["AAA", "BBB"], ["BBB", "CCC"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        trading_tools.yf.download = original
+        trading_tools._HISTORY_CACHE.clear()
+    
+    assert peak[0] == 1, f"{peak[0]} downloads ran at once"
+    downloaded = sorted(ticker for call in calls for ticker in call)
+    assert downloaded == ["AAA", "BBB", "CCC"], f"Downloaded {downloaded}"
+    for histories in results.values():
+        for ticker, hist in histories.items():
+            assert (hist["Close"] == ord(ticker[0])).all(), f"Wrong history for {ticker}"
+    print("✅ Overlapping downloads were serialized and reused the cache")
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Trading Tools Cache Test Suite")
+    print("=" * 50)
+    
+    tests = [test_overlapping_downloads]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+    
+    print("\n" + "=" * 50)
+    print(f"  Tests Passed: {passed}/{len(tests)}")
+
+if __name__ == "__main__":
+    main()